@@ -12,23 +12,47 @@ import numpy as np
 import torch.nn as nn
 from tqdm import tqdm
 import torch
+import queue
+import asyncio
+import itertools
+import tempfile
+import threading
+from collections import deque
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 
 from . import utils
 from . import commons
 from .models import SynthesizerTrn
-from .split_utils import split_sentence
+from .onnx_backend import OnnxSynthesizer, export_onnx
+from .split_utils import split_sentence, split_sentence_stream
 from .mel_processing import spectrogram_torch, spectrogram_torch_conv
 from .download_utils import load_or_download_config, load_or_download_model
 from .ssml import extract_text_from_ssml
 
+# how often threads blocked on the streaming queues check for cancellation, in seconds
+_POLL_INTERVAL = 0.1
+
 class TTS(nn.Module):
     def __init__(self,
                 language,
                 device='auto',
                 use_hf=True,
                 config_path=None,
-                ckpt_path=None):
+                ckpt_path=None,
+                backend='torch',
+                onnx_dir=None):
+        """`backend` is "torch" or "onnxruntime". The onnxruntime backend runs on CPU with the
+        graphs written by `melo export-onnx` to `onnx_dir`, whose config.json is used when no
+        `config_path` is given; without `onnx_dir` the checkpoint is exported on the fly.
+        """
         super().__init__()
+        if backend not in ('torch', 'onnxruntime'):
+            raise ValueError(f'unknown backend {backend!r}, expected "torch" or "onnxruntime"')
+        if backend == 'onnxruntime':
+            device = 'cpu'
+            if onnx_dir is not None and config_path is None and os.path.exists(os.path.join(onnx_dir, 'config.json')):
+                config_path = os.path.join(onnx_dir, 'config.json')
         if device == 'auto':
             device = 'cpu'
             if torch.cuda.is_available(): device = 'cuda'
@@ -42,36 +66,67 @@ class TTS(nn.Module):
         num_tones = hps.num_tones
         symbols = hps.symbols
 
-        model = SynthesizerTrn(
-            len(symbols),
-            hps.data.filter_length // 2 + 1,
-            hps.train.segment_size // hps.data.hop_length,
-            n_speakers=hps.data.n_speakers,
-            num_tones=num_tones,
-            num_languages=num_languages,
-            spk2id=hps.data.spk2id,
-            sampling_rate=hps.data.sampling_rate,
-            **hps.model,
-        ).to(device)
-
-        model.eval()
-        self.model = model
         self.symbol_to_id = {s: i for i, s in enumerate(symbols)}
         self.hps = hps
         self.device = device
-        checkpoint_dict = load_or_download_model(language, device, use_hf=use_hf, ckpt_path=ckpt_path)
-        self.model.load_state_dict(checkpoint_dict['model'], strict=True)
+        if onnx_dir is not None and backend == 'onnxruntime':
+            self.model = OnnxSynthesizer(onnx_dir, sampling_rate=hps.data.sampling_rate, spk2id=hps.data.spk2id)
+        else:
+            model = SynthesizerTrn(
+                len(symbols),
+                hps.data.filter_length // 2 + 1,
+                hps.train.segment_size // hps.data.hop_length,
+                n_speakers=hps.data.n_speakers,
+                num_tones=num_tones,
+                num_languages=num_languages,
+                spk2id=hps.data.spk2id,
+                sampling_rate=hps.data.sampling_rate,
+                **hps.model,
+            ).to(device)
+
+            model.eval()
+            checkpoint_dict = load_or_download_model(language, device, use_hf=use_hf, ckpt_path=ckpt_path)
+            model.load_state_dict(checkpoint_dict['model'], strict=True)
+            model.prepare_for_inference()
+            if backend == 'onnxruntime':
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    export_onnx(model, tmp_dir)
+                    model = OnnxSynthesizer(tmp_dir, sampling_rate=hps.data.sampling_rate, spk2id=hps.data.spk2id)
+            self.model = model
         language = language.split('_')[0]
         self.language = 'ZH_MIX_EN' if language == 'ZH' else language
 
     @staticmethod
-    def audio_numpy_concat(segment_data_list, sr, speed=1.):
-        audio_segments = []
-        for segment_data in segment_data_list:
-            audio_segments += segment_data.reshape(-1).tolist()
-            audio_segments += [0] * int((sr * 0.05) / speed)
-        audio_segments = np.array(audio_segments).astype(np.float32)
-        return audio_segments
+    def audio_numpy_concat(segment_data_list, sr, speed=1., out=None, return_offsets=False):
+        """Concatenate segments, each followed by 50ms (scaled by speed) of silence.
+
+        The total length is computed first and everything is written into one float32
+        buffer: a new array, or `out` (a float32 array, or any writable buffer such as a
+        bytearray or memoryview) when given. With `return_offsets` the (start, end)
+        sample range of every segment is returned as well, for slicing without copies.
+        """
+        silence = int((sr * 0.05) / speed)
+        sizes = [segment_data.size for segment_data in segment_data_list]
+        total = sum(sizes) + silence * len(sizes)
+        if out is None:
+            audio = np.empty(total, dtype=np.float32)
+        else:
+            audio = out if isinstance(out, np.ndarray) else np.frombuffer(out, dtype=np.float32)
+            if audio.dtype != np.float32 or audio.ndim != 1:
+                raise ValueError(f"out must be a 1-D float32 buffer, got {audio.dtype} with {audio.ndim} dims")
+            if audio.size < total:
+                raise ValueError(f"out holds {audio.size} samples, {total} are needed")
+            audio = audio[:total]
+        offsets = []
+        pos = 0
+        for segment_data, size in zip(segment_data_list, sizes):
+            audio[pos:pos + size] = segment_data.reshape(-1)
+            audio[pos + size:pos + size + silence] = 0
+            offsets.append((pos, pos + size))
+            pos += size + silence
+        if return_offsets:
+            return audio, offsets
+        return audio
 
     @staticmethod
     def split_sentences_into_pieces(text, language, quiet=False):
@@ -82,7 +137,91 @@ class TTS(nn.Module):
             print(" > ===========================")
         return texts
 
-    def tts_to_file(self, text, speaker_id, output_path=None, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, pbar=None, format=None, position=None, quiet=False, ssml=False, ssml_attributes={}):
+    def _get_infer_inputs(self, text):
+        return self._get_infer_inputs_batch([text])[0]
+
+    def _get_infer_inputs_batch(self, texts):
+        language = self.language
+        if language in ['EN', 'ZH_MIX_EN']:
+            texts = [re.sub(r'([a-z])([A-Z])', r'\1 \2', text) for text in texts]
+        return utils.get_texts_for_tts_infer(texts, language, self.hps, self.device, self.symbol_to_id)
+
+    def _pipelined_inputs(self, texts, workers=1, prefetch=2, group_size=1):
+        """Yield `_get_infer_inputs(t)` for each text, in order.
+
+        Texts are prepared `group_size` at a time so each group shares one BERT forward
+        pass. With `workers > 0` the frontend (normalization, g2p, BERT) runs on a thread
+        pool and prepares up to `prefetch` groups ahead, so it overlaps with the acoustic
+        model running on the caller's thread.
+        """
+        texts = iter(texts)
+        groups = iter(lambda: list(itertools.islice(texts, max(group_size, 1))), [])
+        if workers <= 0:
+            for group in groups:
+                yield from self._get_infer_inputs_batch(group)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for group in groups:
+                pending.append(pool.submit(self._get_infer_inputs_batch, group))
+                if len(pending) > prefetch:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _collate(self, inputs):
+        device = self.device
+        lengths = [phones.size(0) for _, _, phones, _, _ in inputs]
+        batch_size, max_len = len(inputs), max(lengths)
+        x_tst = torch.zeros(batch_size, max_len, dtype=torch.long)
+        tones = torch.zeros(batch_size, max_len, dtype=torch.long)
+        lang_ids = torch.zeros(batch_size, max_len, dtype=torch.long)
+        bert = torch.zeros(batch_size, 1024, max_len)
+        ja_bert = torch.zeros(batch_size, 768, max_len)
+        for i, (b, jb, p, t, l) in enumerate(inputs):
+            n = lengths[i]
+            x_tst[i, :n] = p
+            tones[i, :n] = t
+            lang_ids[i, :n] = l
+            bert[i, :, :n] = b
+            ja_bert[i, :, :n] = jb
+        x_tst_lengths = torch.LongTensor(lengths)
+        return tuple(t.to(device) for t in (x_tst, x_tst_lengths, tones, lang_ids, bert, ja_bert))
+
+    def _infer_batch(self, inputs, speaker_ids, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, ssml_attributes={}):
+        """Run one `SynthesizerTrn.infer` call over several sentences.
+
+        The phone/tone/language/BERT tensors from `_get_infer_inputs` are right-padded
+        into a [B, T] batch, and each waveform is trimmed back to its own length using
+        the returned `y_mask`.
+        """
+        with torch.no_grad():
+            x_tst, x_tst_lengths, tones, lang_ids, bert, ja_bert = self._collate(inputs)
+            speakers = torch.LongTensor(speaker_ids).to(self.device)
+            batch_size = x_tst.size(0)
+            o, _, y_mask, _ = self.model.infer(
+                x_tst,
+                x_tst_lengths,
+                speakers,
+                tones,
+                lang_ids,
+                bert,
+                ja_bert,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                length_scale=1. / speed,
+                ssml_attributes=ssml_attributes
+            )
+            hop_length = self.model.dec.upsample_factor
+            # break tags in ssml_attributes append silence after the last frame
+            extra = o.size(-1) - y_mask.size(-1) * hop_length
+            audio_lengths = (y_mask.sum(dim=(1, 2)).long() * hop_length + extra).tolist()
+            o = o[:, 0].data.cpu().float().numpy()
+            del x_tst, tones, lang_ids, bert, ja_bert, x_tst_lengths, speakers, y_mask
+        return [o[i, :audio_lengths[i]] for i in range(batch_size)]
+
+    def tts_to_file(self, text, speaker_id, output_path=None, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, pbar=None, format=None, position=None, quiet=False, ssml=False, ssml_attributes={}, batch_size=1, frontend_workers=1):
         language = self.language
         if ssml:
             texts = [extract_text_from_ssml(text)['text']]
@@ -102,37 +241,15 @@ class TTS(nn.Module):
                 tx = tqdm(texts)
         
         audio_list = []
-        for t in tx:
-            if language in ['EN', 'ZH_MIX_EN']:
-                t = re.sub(r'([a-z])([A-Z])', r'\1 \2', t)
-            device = self.device
-            bert, ja_bert, phones, tones, lang_ids = utils.get_text_for_tts_infer(t, language, self.hps, device, self.symbol_to_id)
-
-            with torch.no_grad():
-                x_tst = phones.to(device).unsqueeze(0)
-                tones = tones.to(device).unsqueeze(0)
-                lang_ids = lang_ids.to(device).unsqueeze(0)
-                bert = bert.to(device).unsqueeze(0)
-                ja_bert = ja_bert.to(device).unsqueeze(0)
-                x_tst_lengths = torch.LongTensor([phones.size(0)]).to(device)
-                del phones
-                speakers = torch.LongTensor([speaker_id]).to(device)
-                audio = self.model.infer(
-                    x_tst,
-                    x_tst_lengths,
-                    speakers,
-                    tones,
-                    lang_ids,
-                    bert,
-                    ja_bert,
-                    sdp_ratio=sdp_ratio,
-                    noise_scale=noise_scale,
-                    noise_scale_w=noise_scale_w,
-                    length_scale=1. / speed,
-                    ssml_attributes=ssml_attributes
-                )[0][0, 0].data.cpu().float().numpy()
-                del x_tst, tones, lang_ids, bert, ja_bert, x_tst_lengths, speakers
-            audio_list.append(audio)
+        batch = []
+        for inputs in self._pipelined_inputs(tx, workers=frontend_workers, group_size=batch_size):
+            batch.append(inputs)
+            if len(batch) < batch_size:
+                continue
+            audio_list += self._infer_batch(batch, [speaker_id] * len(batch), sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, ssml_attributes=ssml_attributes)
+            batch = []
+        if batch:
+            audio_list += self._infer_batch(batch, [speaker_id] * len(batch), sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, ssml_attributes=ssml_attributes)
 
         torch.cuda.empty_cache()
         audio = self.audio_numpy_concat(audio_list, sr=self.hps.data.sampling_rate, speed=speed)
@@ -144,3 +261,197 @@ class TTS(nn.Module):
                 soundfile.write(output_path, audio, self.hps.data.sampling_rate, format=format)
             else:
                 soundfile.write(output_path, audio, self.hps.data.sampling_rate)
+
+    def tts_stream(self, text, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, quiet=True, dtype=np.float32, chunk_size=None, frontend_workers=1):
+        """Yield audio one sentence at a time as soon as it is synthesized.
+
+        Every sentence is followed by the same silence `audio_numpy_concat` would insert,
+        so concatenating the chunks gives the `tts_to_file` result. `dtype` is either
+        np.float32 or np.int16 (PCM). With `chunk_size` (in latent frames) the vocoder
+        runs in overlapping windows and each sentence is yielded in several pieces.
+        """
+        texts = self.split_sentences_into_pieces(text, self.language, quiet)
+        yield from self._stream_audio(self._pipelined_inputs(texts, workers=frontend_workers), speaker_id, sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, dtype=dtype, chunk_size=chunk_size)
+
+    def tts_from_stream(self, text_iter, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, dtype=np.float32, chunk_size=None):
+        """`tts_stream` for text that arrives in fragments, such as the tokens of an LLM.
+
+        `text_iter` is an iterator of strings, or an async iterator, in which case an async
+        generator is returned. The fragments are split into sentences incrementally with the
+        `split_sentence` rules, and each sentence is synthesized as soon as it is complete
+        while later fragments are still arriving. Audio chunks are yielded in order, as in
+        `tts_stream`.
+        """
+        kwargs = dict(sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, dtype=dtype, chunk_size=chunk_size)
+        if hasattr(text_iter, '__aiter__'):
+            return self._tts_from_async_stream(text_iter, speaker_id, **kwargs)
+        return self._stream_audio(self._stream_inputs(text_iter), speaker_id, **kwargs)
+
+    async def _tts_from_async_stream(self, text_iter, speaker_id, **kwargs):
+        # the synchronous pipeline runs on its own thread and pulls the fragments back
+        # from the event loop, which stays free while audio is being produced
+        loop = asyncio.get_running_loop()
+        fragments_aiter = text_iter.__aiter__()
+        stop = threading.Event()
+
+        async def next_fragment():
+            try:
+                return True, await fragments_aiter.__anext__()
+            except StopAsyncIteration:
+                return False, None
+
+        def fragments():
+            while not stop.is_set():
+                future = asyncio.run_coroutine_threadsafe(next_fragment(), loop)
+                while True:
+                    try:
+                        more, fragment = future.result(timeout=_POLL_INTERVAL)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        if stop.is_set():
+                            future.cancel()
+                            return
+                if not more:
+                    return
+                yield fragment
+
+        chunks = self._stream_audio(self._stream_inputs(fragments(), stop=stop), speaker_id, **kwargs)
+        executor = ThreadPoolExecutor(max_workers=1)
+        done = object()
+        pending = None
+        try:
+            while True:
+                pending = executor.submit(next, chunks, done)
+                chunk = await asyncio.wrap_future(pending)
+                if chunk is done:
+                    return
+                yield chunk
+        finally:
+            # on cancellation next() may still be running, the generator is closed on the
+            # worker thread once it returns
+            stop.set()
+            if pending is None:
+                chunks.close()
+            else:
+                pending.add_done_callback(lambda _: chunks.close())
+            executor.shutdown(wait=False)
+
+    def _stream_inputs(self, text_iter, stop=None, prefetch=2):
+        """Yield `_get_infer_inputs` for every sentence of the text coming from `text_iter`.
+
+        A thread reads the fragments, splits them and runs the frontend on each sentence as
+        soon as it is complete, so it keeps up with the text while the caller runs the
+        acoustic model. At most `prefetch` sentences are prepared ahead. Setting `stop`
+        (a threading.Event) ends both sides; it is also set when this generator is closed.
+        """
+        results = queue.Queue(maxsize=prefetch)
+        if stop is None:
+            stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for sentence in split_sentence_stream(text_iter, language_str=self.language):
+                    if stop.is_set() or not put(self._get_infer_inputs(sentence)):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                try:
+                    item = results.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    if stop.is_set():
+                        return
+                    continue
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    def _stream_audio(self, inputs_iter, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, dtype=np.float32, chunk_size=None):
+        silence = np.zeros(int((self.hps.data.sampling_rate * 0.05) / speed), dtype=np.float32)
+        for inputs in inputs_iter:
+            if chunk_size is None:
+                audio = self._infer_batch([inputs], [speaker_id], sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed)[0]
+                yield self.audio_to_dtype(np.concatenate([audio, silence]), dtype)
+                continue
+            x_tst, x_tst_lengths, tones, lang_ids, bert, ja_bert = self._collate([inputs])
+            speakers = torch.LongTensor([speaker_id]).to(self.device)
+            for chunk in self.model.infer_stream(
+                x_tst,
+                x_tst_lengths,
+                speakers,
+                tones,
+                lang_ids,
+                bert,
+                ja_bert,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                length_scale=1. / speed,
+                chunk_size=chunk_size,
+            ):
+                yield self.audio_to_dtype(chunk[0, 0].data.cpu().float().numpy(), dtype)
+            yield self.audio_to_dtype(silence, dtype)
+
+    @staticmethod
+    def audio_to_dtype(audio, dtype=np.float32):
+        if np.dtype(dtype) == np.int16:
+            return (np.clip(audio, -1., 1.) * 32767).astype(np.int16)
+        return audio.astype(dtype, copy=False)
+
+    def synthesize_many(self, texts, speaker_ids, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, batch_size=8, quiet=True, frontend_workers=1):
+        """Synthesize several texts, batching their sentences through the acoustic model.
+
+        `speaker_ids` is either a single speaker id or one id per text. Sentences from all
+        texts are sorted by phone length before batching to keep padding small. Returns
+        one float32 waveform per text.
+        """
+        if isinstance(speaker_ids, int):
+            speaker_ids = [speaker_ids] * len(texts)
+        assert len(speaker_ids) == len(texts), "need one speaker id per text"
+
+        sentences = []
+        for text_idx, text in enumerate(texts):
+            for t in self.split_sentences_into_pieces(text, self.language, quiet=True):
+                sentences.append((text_idx, t))
+        items = [
+            (n, text_idx, inputs)
+            for n, ((text_idx, _), inputs) in enumerate(zip(sentences, self._pipelined_inputs([t for _, t in sentences], workers=frontend_workers, group_size=batch_size)))
+        ]
+        order = sorted(items, key=lambda item: item[2][2].size(0), reverse=True)
+
+        segments = [None] * len(items)
+        batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+        for batch in (batches if quiet else tqdm(batches)):
+            audios = self._infer_batch(
+                [inputs for _, _, inputs in batch],
+                [speaker_ids[text_idx] for _, text_idx, _ in batch],
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                speed=speed,
+            )
+            for (n, _, _), audio in zip(batch, audios):
+                segments[n] = audio
+        torch.cuda.empty_cache()
+
+        audio_lists = [[] for _ in texts]
+        for (n, text_idx, _), audio in zip(items, segments):
+            audio_lists[text_idx].append(audio)
+        return [self.audio_numpy_concat(audio_list, sr=self.hps.data.sampling_rate, speed=speed) for audio_list in audio_lists]
@@ -4,20 +4,15 @@ import gradio as gr
 import os, torch, io
 # os.system('python -m unidic download')
 print("Make sure you've downloaded unidic (python -m unidic download) for this WebUI to work.")
-from melo.api import TTS
+from melo.registry import registry
 speed = 1.0
 import tempfile
 import click
 device = 'auto'
-models = {
-    'EN': TTS(language='EN', device=device),
-    'ES': TTS(language='ES', device=device),
-    'FR': TTS(language='FR', device=device),
-    'ZH': TTS(language='ZH', device=device),
-    'JP': TTS(language='JP', device=device),
-    'KR': TTS(language='KR', device=device),
-}
-speaker_ids = models['EN'].hps.data.spk2id
+def get_model(language):
+    # models are loaded on first use and shared through the process-wide registry
+    return registry.get(language, device=device)
+speaker_ids = get_model('EN').hps.data.spk2id
 
 default_text_dict = {
     'EN': 'The field of text-to-speech has seen rapid development recently.',
@@ -30,14 +25,16 @@ default_text_dict = {
     
 def synthesize(speaker, text, speed, language, progress=gr.Progress()):
     bio = io.BytesIO()
-    models[language].tts_to_file(text, models[language].hps.data.spk2id[speaker], bio, speed=speed, pbar=progress.tqdm, format='wav')
+    model = get_model(language)
+    model.tts_to_file(text, model.hps.data.spk2id[speaker], bio, speed=speed, pbar=progress.tqdm, format='wav')
     return bio.getvalue()
 def load_speakers(language, text):
     if text in list(default_text_dict.values()):
         newtext = default_text_dict[language]
     else:
         newtext = text
-    return gr.update(value=list(models[language].hps.data.spk2id.keys())[0], choices=list(models[language].hps.data.spk2id.keys())), newtext
+    spk2id = get_model(language).hps.data.spk2id
+    return gr.update(value=list(spk2id.keys())[0], choices=list(spk2id.keys())), newtext
 with gr.Blocks() as demo:
     gr.Markdown('# MeloTTS WebUI\n\nA WebUI for MeloTTS.')
     with gr.Group():
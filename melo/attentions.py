@@ -100,8 +100,7 @@ class Encoder(nn.Module):
         x = x * x_mask
         for i in range(self.n_layers):
             if i == self.cond_layer_idx and g is not None:
-                g = self.spk_emb_linear(g.transpose(1, 2))
-                g = g.transpose(1, 2)
+                g = commons.condition(self.spk_emb_linear, g)
                 x = x + g
                 x = x * x_mask
             y = self.attn_layers[i](x, x, attn_mask)
@@ -229,6 +228,8 @@ class MultiHeadAttention(nn.Module):
         self.attn = None
 
         self.k_channels = channels // n_heads
+        self.query_scale = math.sqrt(self.k_channels)
+        self.conv_qkv = None  # set by fuse_qkv
         self.conv_q = nn.Conv1d(channels, channels, 1)
         self.conv_k = nn.Conv1d(channels, channels, 1)
         self.conv_v = nn.Conv1d(channels, channels, 1)
@@ -256,15 +257,34 @@ class MultiHeadAttention(nn.Module):
                 self.conv_k.bias.copy_(self.conv_q.bias)
 
     def forward(self, x, c, attn_mask=None):
-        q = self.conv_q(x)
-        k = self.conv_k(c)
-        v = self.conv_v(c)
+        if self.conv_qkv is None:
+            q = self.conv_q(x)
+            k = self.conv_k(c)
+            v = self.conv_v(c)
+        elif x is c:
+            q, k, v = torch.split(self.conv_qkv(x), self.channels, dim=1)
+        else:
+            weight, bias = self.conv_qkv.weight, self.conv_qkv.bias
+            q = F.conv1d(x, weight[: self.channels], bias[: self.channels])
+            k, v = torch.split(F.conv1d(c, weight[self.channels :], bias[self.channels :]), self.channels, dim=1)
 
         x, self.attn = self.attention(q, k, v, mask=attn_mask)
 
         x = self.conv_o(x)
         return x
 
+    def fuse_qkv(self):
+        """Fold the query scaling into `conv_q` and stack the q/k/v projections into one conv."""
+        if self.conv_qkv is not None:
+            return
+        conv_qkv = nn.Conv1d(self.channels, 3 * self.channels, 1)
+        with torch.no_grad():
+            conv_qkv.weight.copy_(torch.cat([self.conv_q.weight / self.query_scale, self.conv_k.weight, self.conv_v.weight]))
+            conv_qkv.bias.copy_(torch.cat([self.conv_q.bias / self.query_scale, self.conv_k.bias, self.conv_v.bias]))
+        self.conv_qkv = conv_qkv.to(self.conv_q.weight)
+        del self.conv_q, self.conv_k, self.conv_v
+        self.query_scale = 1.0
+
     def attention(self, query, key, value, mask=None):
         # reshape [b, d, t] -> [b, n_h, t, d_k]
         b, d, t_s, t_t = (*key.size(), query.size(2))
@@ -272,15 +292,15 @@ class MultiHeadAttention(nn.Module):
         key = key.view(b, self.n_heads, self.k_channels, t_s).transpose(2, 3)
         value = value.view(b, self.n_heads, self.k_channels, t_s).transpose(2, 3)
 
-        scores = torch.matmul(query / math.sqrt(self.k_channels), key.transpose(-2, -1))
+        if self.query_scale != 1.0:
+            query = query / self.query_scale
+        scores = torch.matmul(query, key.transpose(-2, -1))
         if self.window_size is not None:
             assert (
                 t_s == t_t
             ), "Relative attention is only available for self-attention."
             key_relative_embeddings = self._get_relative_embeddings(self.emb_rel_k, t_s)
-            rel_logits = self._matmul_with_relative_keys(
-                query / math.sqrt(self.k_channels), key_relative_embeddings
-            )
+            rel_logits = self._matmul_with_relative_keys(query, key_relative_embeddings)
             scores_local = self._relative_position_to_absolute_position(rel_logits)
             scores = scores + scores_local
         if self.proximal_bias:
@@ -0,0 +1,160 @@
+import time
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+
+class _Request:
+    def __init__(self, n_segments, speed):
+        self.future = Future()
+        self.segments = [None] * n_segments
+        self.remaining = n_segments
+        self.speed = speed
+
+
+class _Item:
+    def __init__(self, request, index, inputs, speaker_id, key, bucket):
+        self.request = request
+        self.index = index
+        self.inputs = inputs
+        self.speaker_id = speaker_id
+        self.key = key
+        self.bucket = bucket
+        self.length = inputs[2].size(0)
+        self.arrival = time.monotonic()
+
+
+class BatchScheduler:
+    """Collects concurrent requests to a `TTS` and runs them through `SynthesizerTrn.infer` in batches.
+
+    `submit` runs the text frontend in the calling thread, with all sentences of a request
+    sharing one BERT forward pass, and returns a Future; a single worker thread groups
+    pending sentences that share the same synthesis parameters and length bucket, and
+    dispatches a batch once it holds `max_batch_size` sentences or
+    `max_tokens` padded phones, or once its oldest sentence has waited `max_delay`
+    seconds. Speaker ids are batched, so requests for different speakers share a pass.
+
+        scheduler = BatchScheduler(model, max_batch_size=8, max_delay=0.02)
+        audio = scheduler.submit(text, speaker_id).result()
+    """
+
+    def __init__(self, tts, max_batch_size=8, max_tokens=4096, max_delay=0.01, bucket_width=32):
+        self.tts = tts
+        self.max_batch_size = max_batch_size
+        self.max_tokens = max_tokens
+        self.max_delay = max_delay
+        self.bucket_width = bucket_width
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, text, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0):
+        texts = self.tts.split_sentences_into_pieces(text, self.tts.language, quiet=True)
+        request = _Request(len(texts), speed)
+        if not texts:
+            request.future.set_result(self.tts.audio_numpy_concat([], sr=self.tts.hps.data.sampling_rate, speed=speed))
+            return request.future
+        key = (sdp_ratio, noise_scale, noise_scale_w, speed)
+        items = []
+        for i, inputs in enumerate(self.tts._get_infer_inputs_batch(texts)):
+            items.append(_Item(request, i, inputs, speaker_id, key, inputs[2].size(0) // self.bucket_width))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchScheduler is closed")
+            self._pending.extend(items)
+            self._cond.notify()
+        return request.future
+
+    def close(self, wait=True):
+        """Stop accepting requests; pending ones are still synthesized."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if wait:
+            self._worker.join()
+
+    def _group_batch(self, key, bucket):
+        batch, max_len = [], 0
+        for item in self._pending:
+            if item.key != key or item.bucket != bucket:
+                continue
+            if batch and (len(batch) + 1) * max(max_len, item.length) > self.max_tokens:
+                return batch, True
+            batch.append(item)
+            max_len = max(max_len, item.length)
+            if len(batch) == self.max_batch_size:
+                return batch, True
+        return batch, len(batch) * max_len >= self.max_tokens
+
+    def _take_batch(self):
+        # a full group is dispatched right away, even while an older group is still
+        # waiting out `max_delay`; groups are ordered by their oldest sentence
+        groups = [self._group_batch(key, bucket) for key, bucket in dict.fromkeys((item.key, item.bucket) for item in self._pending)]
+        batch = next((batch for batch, full in groups if full), None)
+        if batch is None:
+            wait = self.max_delay - (time.monotonic() - self._pending[0].arrival)
+            if wait > 0 and not self._closed:
+                return None, wait
+            batch = groups[0][0]
+        taken = set(map(id, batch))
+        self._pending = [item for item in self._pending if id(item) not in taken]
+        return batch, 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, wait = self._take_batch()
+                if batch is None:
+                    self._cond.wait(timeout=wait)
+                    continue
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # any failure is handed to the requests of the batch, the worker keeps running;
+        # a Future cancelled by its caller meanwhile is skipped
+        sdp_ratio, noise_scale, noise_scale_w, speed = batch[0].key
+        try:
+            audios = self.tts._infer_batch(
+                [item.inputs for item in batch],
+                [item.speaker_id for item in batch],
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                speed=speed,
+            )
+            if len(audios) != len(batch):
+                raise RuntimeError(f"expected {len(batch)} segments, got {len(audios)}")
+            for item, audio in zip(batch, audios):
+                request = item.request
+                if request.future.done():
+                    continue
+                request.segments[item.index] = audio
+                request.remaining -= 1
+                if request.remaining == 0:
+                    audio = self.tts.audio_numpy_concat(request.segments, sr=self.tts.hps.data.sampling_rate, speed=request.speed)
+                    _resolve(request.future, audio)
+        except Exception as e:
+            for item in batch:
+                _resolve(item.request.future, exception=e)
+
+
+def _resolve(future, result=None, exception=None):
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # already resolved, or cancelled by the caller
+        pass
@@ -158,3 +158,42 @@ def clip_grad_value_(parameters, clip_value, norm_type=2):
             p.grad.data.clamp_(min=-clip_value, max=clip_value)
     total_norm = total_norm ** (1.0 / norm_type)
     return total_norm
+
+
+class SpeakerConditioning:
+    """A speaker embedding `g` [b, gin_channels, 1] that memoizes its projections.
+
+    The conditioning layers (the `cond` convs, `WN.cond_layer`, the encoder's
+    `spk_emb_linear`) only see `g`, so each projection is computed once and then reused
+    by every later call, and every flow layer, that conditions on the same speakers.
+    Only for inference: projections are computed without autograd.
+    """
+
+    def __init__(self, g):
+        self.g = g
+        self.projections = {}
+
+    def project(self, layer):
+        out = self.projections.get(layer)
+        if out is None:
+            with torch.no_grad():
+                if isinstance(layer, torch.nn.Linear):
+                    out = layer(self.g.transpose(1, 2)).transpose(1, 2)
+                else:
+                    out = layer(self.g)
+            self.projections[layer] = out
+        return out
+
+
+def condition(layer, g, detach=False):
+    """`layer(g)` for a conditioning layer; `g` is a tensor or a `SpeakerConditioning`.
+
+    Linear layers are applied over the channel axis of `g`.
+    """
+    if isinstance(g, SpeakerConditioning):
+        return g.project(layer)
+    if detach:
+        g = torch.detach(g)
+    if isinstance(layer, torch.nn.Linear):
+        return layer(g.transpose(1, 2)).transpose(1, 2)
+    return layer(g)
@@ -1,6 +1,7 @@
 import click
 import warnings
 import os
+import sys
 
 
 @click.command
@@ -25,8 +26,8 @@ def main(text, file, output_path, language, speaker, speed, device):
     if speaker == '': speaker = None
     if (not language == 'EN') and speaker:
         warnings.warn('You specified a speaker but the language is English.')
-    from melo.api import TTS
-    model = TTS(language=language, device=device)
+    from melo.registry import registry
+    model = registry.get(language, device=device)
     speaker_ids = model.hps.data.spk2id
     if language == 'EN':
         if not speaker: speaker = 'EN-Default'
@@ -34,3 +35,25 @@ def main(text, file, output_path, language, speaker, speed, device):
     else:
         spkr = speaker_ids[list(speaker_ids.keys())[0]]
     model.tts_to_file(text, spkr, output_path, speed=speed)
+
+
+@click.command(name='export-onnx')
+@click.argument('output_dir')
+@click.option('--language', '-l', default='EN', help='Language, defaults to English', type=click.Choice(['EN', 'ES', 'FR', 'ZH', 'JP', 'KR'], case_sensitive=False))
+@click.option('--config_path', default=None, help='Model config, downloaded by default')
+@click.option('--ckpt_path', default=None, help='Model checkpoint, downloaded by default')
+@click.option('--opset', default=17, help='ONNX opset version, defaults to 17', type=int)
+def export_onnx(output_dir, language, config_path, ckpt_path, opset):
+    """Export the inference graph to OUTPUT_DIR as encoder, flow and decoder ONNX models."""
+    from melo.api import TTS
+    from melo.onnx_backend import export_onnx as export
+    model = TTS(language.upper(), device='cpu', config_path=config_path, ckpt_path=ckpt_path)
+    export(model.model, output_dir, opset_version=opset, hps=model.hps)
+    print(f'Exported to {output_dir}, load it with TTS(language, backend="onnxruntime", onnx_dir=...)')
+
+
+def cli():
+    # `melo TEXT OUTPUT_PATH` keeps working, `melo export-onnx ...` dispatches to the subcommand
+    if sys.argv[1:2] == ['export-onnx']:
+        return export_onnx(sys.argv[2:], prog_name='melo export-onnx')
+    return main()
@@ -1,5 +1,7 @@
 import math
 import torch
+import threading
+from collections import OrderedDict
 from torch import nn
 from torch.nn import functional as F
 
@@ -207,8 +209,7 @@ class StochasticDurationPredictor(nn.Module):
         x = torch.detach(x)
         x = self.pre(x)
         if g is not None:
-            g = torch.detach(g)
-            x = x + self.cond(g)
+            x = x + commons.condition(self.cond, g, detach=True)
         x = self.convs(x, x_mask)
         x = self.proj(x) * x_mask
 
@@ -294,8 +295,7 @@ class DurationPredictor(nn.Module):
     def forward(self, x, x_mask, g=None):
         x = torch.detach(x)
         if g is not None:
-            g = torch.detach(g)
-            x = x + self.cond(g)
+            x = x + commons.condition(self.cond, g, detach=True)
         x = self.conv_1(x * x_mask)
         x = torch.relu(x)
         x = self.norm_1(x)
@@ -337,6 +337,7 @@ class TextEncoder(nn.Module):
         self.kernel_size = kernel_size
         self.p_dropout = p_dropout
         self.gin_channels = gin_channels
+        self.emb_scale = math.sqrt(hidden_channels)
         self.emb = nn.Embedding(n_vocab, hidden_channels)
         nn.init.normal_(self.emb.weight, 0.0, hidden_channels**-0.5)
         self.tone_emb = nn.Embedding(num_tones, hidden_channels)
@@ -366,9 +367,9 @@ class TextEncoder(nn.Module):
             + self.language_emb(language)
             + bert_emb
             + ja_bert_emb
-        ) * math.sqrt(
-            self.hidden_channels
         )  # [b, t, h]
+        if self.emb_scale != 1.0:
+            x = x * self.emb_scale
         x = torch.transpose(x, 1, -1)  # [b, h, t]
         x_mask = torch.unsqueeze(commons.sequence_mask(x_lengths, x.size(2)), 1).to(
             x.dtype
@@ -380,6 +381,15 @@ class TextEncoder(nn.Module):
         m, logs = torch.split(stats, self.out_channels, dim=1)
         return x, m, logs, x_mask
 
+    def fold_emb_scale(self):
+        """Scale the embedding and BERT projection weights by `emb_scale` instead of their sum in `forward`."""
+        with torch.no_grad():
+            for layer in (self.emb, self.tone_emb, self.language_emb, self.bert_proj, self.ja_bert_proj):
+                layer.weight.mul_(self.emb_scale)
+                if getattr(layer, "bias", None) is not None:
+                    layer.bias.mul_(self.emb_scale)
+        self.emb_scale = 1.0
+
 
 class ResidualCouplingBlock(nn.Module):
     def __init__(
@@ -483,9 +493,25 @@ class Generator(torch.nn.Module):
         super(Generator, self).__init__()
         self.num_kernels = len(resblock_kernel_sizes)
         self.num_upsamples = len(upsample_rates)
+        self.upsample_rates = list(upsample_rates)
         self.conv_pre = Conv1d(
             initial_channel, upsample_initial_channel, 7, 1, padding=3
         )
+        # one-sided receptive field of the decoder in input frames, used to
+        # pad the windows in chunked_forward
+        self.upsample_factor = math.prod(upsample_rates)
+        receptive_field = 3.0
+        scale = 1
+        for u, k in zip(upsample_rates, upsample_kernel_sizes):
+            receptive_field += k / u / scale
+            scale *= u
+            receptive_field += max(
+                sum((rk - 1) // 2 * (d + (1 if resblock == "1" else 0)) for d in ds)
+                for rk, ds in zip(resblock_kernel_sizes, resblock_dilation_sizes)
+            ) / scale
+        receptive_field += 3 / scale
+        self.receptive_field = math.ceil(receptive_field) + 1
+
         resblock = modules.ResBlock1 if resblock == "1" else modules.ResBlock2
 
         self.ups = nn.ModuleList()
@@ -516,20 +542,28 @@ class Generator(torch.nn.Module):
         if gin_channels != 0:
             self.cond = nn.Conv1d(gin_channels, upsample_initial_channel, 1)
 
-    def forward(self, x, g=None):
+    def forward(self, x, g=None, x_mask=None):
+        """With `x_mask` the activations past each item's length are zeroed after every
+        layer, so a right-padded batch decodes like its items one by one."""
         x = self.conv_pre(x)
         if g is not None:
-            x = x + self.cond(g)
+            x = x + commons.condition(self.cond, g)
+        if x_mask is not None:
+            x = x * x_mask
 
         for i in range(self.num_upsamples):
             x = F.leaky_relu(x, modules.LRELU_SLOPE)
             x = self.ups[i](x)
+            if x_mask is not None:
+                b, _, t = x_mask.shape
+                x_mask = x_mask.unsqueeze(-1).expand(b, 1, t, self.upsample_rates[i]).reshape(b, 1, -1)
+                x = x * x_mask
             xs = None
             for j in range(self.num_kernels):
                 if xs is None:
-                    xs = self.resblocks[i * self.num_kernels + j](x)
+                    xs = self.resblocks[i * self.num_kernels + j](x, x_mask)
                 else:
-                    xs += self.resblocks[i * self.num_kernels + j](x)
+                    xs += self.resblocks[i * self.num_kernels + j](x, x_mask)
             x = xs / self.num_kernels
         x = F.leaky_relu(x)
         x = self.conv_post(x)
@@ -537,6 +571,37 @@ class Generator(torch.nn.Module):
 
         return x
 
+    def chunked_forward(self, x, g=None, chunk_size=64, context=None, overlap=4, x_mask=None):
+        """Decode `x` in windows of `chunk_size` frames, yielding audio as each window is done.
+
+        Every window is extended by `context` frames on both sides (the receptive field by
+        default) and the extension is cut from the output, so the chunks line up with
+        `forward`. Neighbouring windows share `overlap` frames that are linearly
+        cross-faded.
+        """
+        if context is None:
+            context = self.receptive_field
+        hop = self.upsample_factor
+        length = x.size(2)
+        tail = None
+        for start in range(0, length, chunk_size):
+            end = min(start + chunk_size + overlap, length)
+            lo, hi = max(start - context, 0), min(end + context, length)
+            o = self.forward(x[:, :, lo:hi], g=g, x_mask=None if x_mask is None else x_mask[:, :, lo:hi])
+            o = o[:, :, (start - lo) * hop : (end - lo) * hop]
+            if tail is not None:
+                n = tail.size(-1)
+                fade = torch.linspace(0, 1, n + 2, device=o.device, dtype=o.dtype)[1:-1]
+                o = torch.cat([tail * (1 - fade) + o[:, :, :n] * fade, o[:, :, n:]], dim=-1)
+                tail = None
+            if end == length:
+                yield o
+                break
+            if overlap > 0:
+                tail = o[:, :, -overlap * hop :]
+                o = o[:, :, : -overlap * hop]
+            yield o
+
     def remove_weight_norm(self):
         print("Removing weight norm...")
         for layer in self.ups:
@@ -749,6 +814,19 @@ class ReferenceEncoder(nn.Module):
         return L
 
 
+def append_break_silence(o, ssml_attributes, sampling_rate):
+    """Append the silence of the SSML break tags in `ssml_attributes` to the [B, 1, T] waveforms `o`."""
+    for break_data in ssml_attributes.get('break', []):
+        if break_data.get('time'):
+            break_time_ms = int(break_data['time'].rstrip('ms'))
+            break_samples = int(break_time_ms / 1000 * sampling_rate)
+            o = torch.cat([o, o.new_zeros(o.size(0), 1, break_samples)], dim=2) # add silence
+        elif break_data.get('strength'):
+            #TODO: handle strength
+            pass
+    return o
+
+
 class SynthesizerTrn(nn.Module):
     """
     Synthesizer for Training
@@ -964,6 +1042,79 @@ class SynthesizerTrn(nn.Module):
         self.use_vc = use_vc
         self.spk2id = kwargs.get("spk2id", None)
         self.sampling_rate = kwargs.get("sampling_rate", 22050) # NEW LINE
+        self.speaker_cache_size = kwargs.get("speaker_cache_size", 64)
+        self._speaker_cache = OrderedDict()
+        self._speaker_lock = threading.Lock()
+
+    def speaker_conditioning(self, sid):
+        """The `SpeakerConditioning` for speaker ids `sid`, built once and then reused.
+
+        Entries are keyed by the tuple of ids in the batch and kept in a bounded LRU. The
+        cache is dropped whenever the weights may change: `load_state_dict`, `train()`
+        and device or dtype moves. The cache is shared by all threads using the model.
+        """
+        key = tuple(sid.tolist())
+        with self._speaker_lock:
+            cond = self._speaker_cache.get(key)
+            if cond is not None:
+                self._speaker_cache.move_to_end(key)
+                return cond
+        with torch.no_grad():
+            cond = commons.SpeakerConditioning(self.emb_g(sid).unsqueeze(-1))
+        with self._speaker_lock:
+            self._speaker_cache[key] = cond
+            while len(self._speaker_cache) > self.speaker_cache_size:
+                self._speaker_cache.popitem(last=False)
+        return cond
+
+    def clear_speaker_cache(self):
+        with self._speaker_lock:
+            self._speaker_cache.clear()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_speaker_cache"] = OrderedDict()
+        del state["_speaker_lock"]
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._speaker_lock = threading.Lock()
+
+    def prepare_for_inference(self):
+        """Strip the model down for inference; afterwards it can neither be trained nor load checkpoints.
+
+        Weight norm is removed from every layer, the posterior encoder and any discriminator are
+        dropped, the embedding scale is folded into the embedding and BERT projection weights and
+        the attention q/k/v projections are fused with the query scale folded in.
+        """
+        for module in self.modules():
+            try:
+                remove_weight_norm(module)
+            except ValueError:
+                pass
+        self.enc_q = None
+        for name, child in list(self.named_children()):
+            if isinstance(child, (DurationDiscriminator, MultiPeriodDiscriminator, DiscriminatorP, DiscriminatorS)):
+                setattr(self, name, None)
+        self.enc_p.fold_emb_scale()
+        for module in list(self.modules()):
+            if isinstance(module, attentions.MultiHeadAttention):
+                module.fuse_qkv()
+        self.requires_grad_(False)
+        return self.eval()
+
+    def load_state_dict(self, *args, **kwargs):
+        self.clear_speaker_cache()
+        return super().load_state_dict(*args, **kwargs)
+
+    def train(self, mode=True):
+        self.clear_speaker_cache()
+        return super().train(mode)
+
+    def _apply(self, fn, *args, **kwargs):
+        self.clear_speaker_cache()
+        return super()._apply(fn, *args, **kwargs)
 
     def forward(self, x, x_lengths, y, y_lengths, sid, tone, language, bert, ja_bert):
         if self.n_speakers > 0:
@@ -1059,7 +1210,8 @@ class SynthesizerTrn(nn.Module):
         sdp_ratio=0,
         y=None,
         g=None,
-        ssml_attributes=None
+        ssml_attributes=None,
+        chunk_size=None,
     ):
         if ssml_attributes is None:
             ssml_attributes = {}
@@ -1072,8 +1224,101 @@ class SynthesizerTrn(nn.Module):
             else:
                 print(f"Warning: voice name {voice_name} not found, using default speaker")
 
+        z, y_mask, g, (attn, z_p, m_p, logs_p) = self.infer_latent(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            noise_scale=noise_scale,
+            length_scale=length_scale,
+            noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio,
+            y=y,
+            g=g,
+        )
+        # items of a padded batch are masked inside the decoder, so their ends are not
+        # affected by the padding
+        dec_mask = y_mask[:, :, :max_len] if y_mask.size(0) > 1 else None
+        if chunk_size is None:
+            o = self.dec((z * y_mask)[:, :, :max_len], g=g, x_mask=dec_mask)
+        else:
+            o = torch.cat(
+                list(self.dec.chunked_forward((z * y_mask)[:, :, :max_len], g=g, chunk_size=chunk_size, x_mask=dec_mask)),
+                dim=-1,
+            )
+        # print('max/min of o:', o.max(), o.min())
+
+        # Handle break tag
+        o = append_break_silence(o, ssml_attributes, self.sampling_rate)
+
+        # Enhanced SSML processing
+        if ssml_attributes:
+            # Handle voice changes
+            if 'voice' in ssml_attributes:
+                for voice in ssml_attributes['voice']:
+                    if voice['name'] in self.spk2id:
+                        sid = torch.LongTensor([self.spk2id[voice['name']]]).to(x.device)
+
+            # Handle express-as styles
+            if 'mstts:express-as' in ssml_attributes:
+                for style in ssml_attributes['mstts:express-as']:
+                    # Adjust model parameters based on style
+                    if style['style'] == 'cheerful':
+                        noise_scale *= 1.1
+                        length_scale *= 0.95
+                    elif style['style'] == 'sad':
+                        noise_scale *= 0.9
+                        length_scale *= 1.1
+                    elif style['style'] == 'whispering':
+                        noise_scale *= 0.7
+
+        return o, attn, y_mask, (z, z_p, m_p, logs_p)
+
+    def infer_latent(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        sdp_ratio=0,
+        y=None,
+        g=None,
+    ):
+        """Run everything in `infer` up to the decoder and return the latent `z`."""
+        m_p, logs_p, x_mask, w_ceil, g = self.infer_durations(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            length_scale=length_scale,
+            noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio,
+            y=y,
+            g=g,
+        )
+        z, y_mask, (attn, z_p, m_p, logs_p) = self.infer_frames(m_p, logs_p, x_mask, w_ceil, g, noise_scale=noise_scale)
+        return z, y_mask, g, (attn, z_p, m_p, logs_p)
+
+    def infer_durations(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        length_scale=1,
+        noise_scale_w=0.8,
+        sdp_ratio=0,
+        y=None,
+        g=None,
+    ):
+        """Text encoder and duration predictors: the phone statistics and the frame count `w_ceil` of every phone."""
         if g is None:
-            if self.n_speakers > 0:
+            if self.n_speakers > 0 and not self.training:
+                g = self.speaker_conditioning(sid)
+            elif self.n_speakers > 0:
                 g = self.emb_g(sid).unsqueeze(-1)  # [b, h, 1]
             else:
                 g = self.ref_enc(y.transpose(1, 2)).unsqueeze(-1)
@@ -1090,6 +1335,10 @@ class SynthesizerTrn(nn.Module):
         w = torch.exp(logw) * x_mask * length_scale
         
         w_ceil = torch.ceil(w)
+        return m_p, logs_p, x_mask, w_ceil, g
+
+    def infer_frames(self, m_p, logs_p, x_mask, w_ceil, g, noise_scale=0.667):
+        """Length regulator and reverse flow: expand the phone statistics by `w_ceil` and sample `z`."""
         y_lengths = torch.clamp_min(torch.sum(w_ceil, [1, 2]), 1).long()
         y_mask = torch.unsqueeze(commons.sequence_mask(y_lengths, None), 1).to(
             x_mask.dtype
@@ -1106,42 +1355,35 @@ class SynthesizerTrn(nn.Module):
 
         z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
         z = self.flow(z_p, y_mask, g=g, reverse=True)
-        o = self.dec((z * y_mask)[:, :, :max_len], g=g)
-        # print('max/min of o:', o.max(), o.min())
-
-        # Handle break tag
-        if 'break' in ssml_attributes:
-            for break_data in ssml_attributes['break']:
-                if break_data.get('time'):
-                    break_time_ms = int(break_data['time'].rstrip('ms'))
-                    break_samples = int(break_time_ms / 1000 * self.sampling_rate)
-                    o = torch.cat([o, torch.zeros(1, 1, break_samples).to(o.device)], dim=2) # add silence
-                elif break_data.get('strength'):
-                    #TODO: handle strength
-                    pass
-
-        # Enhanced SSML processing
-        if ssml_attributes:
-            # Handle voice changes
-            if 'voice' in ssml_attributes:
-                for voice in ssml_attributes['voice']:
-                    if voice['name'] in self.spk2id:
-                        sid = torch.LongTensor([self.spk2id[voice['name']]]).to(x.device)
+        return z, y_mask, (attn, z_p, m_p, logs_p)
 
-            # Handle express-as styles
-            if 'mstts:express-as' in ssml_attributes:
-                for style in ssml_attributes['mstts:express-as']:
-                    # Adjust model parameters based on style
-                    if style['style'] == 'cheerful':
-                        noise_scale *= 1.1
-                        length_scale *= 0.95
-                    elif style['style'] == 'sad':
-                        noise_scale *= 0.9
-                        length_scale *= 1.1
-                    elif style['style'] == 'whispering':
-                        noise_scale *= 0.7
-
-        return o, attn, y_mask, (z, z_p, m_p, logs_p)
+    @torch.no_grad()
+    def infer_stream(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        max_len=None,
+        sdp_ratio=0,
+        chunk_size=64,
+    ):
+        """Like `infer`, but yields the waveform in chunks of `chunk_size` frames."""
+        z, y_mask, g, _ = self.infer_latent(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            noise_scale=noise_scale,
+            length_scale=length_scale,
+            noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio,
+        )
+        dec_mask = y_mask[:, :, :max_len] if y_mask.size(0) > 1 else None
+        yield from self.dec.chunked_forward((z * y_mask)[:, :, :max_len], g=g, chunk_size=chunk_size, x_mask=dec_mask)
 
     def voice_conversion(self, y, y_lengths, sid_src, sid_tgt, tau=1.0):        
         g_src = sid_src
@@ -0,0 +1,298 @@
+"""ONNX export of `SynthesizerTrn.infer` and an onnxruntime backend for `TTS`.
+
+The inference graph is exported as three models, so that the vocoder can be run in
+chunks:
+
+- encoder.onnx: text encoder and duration predictors (`SynthesizerTrn.infer_durations`)
+- flow.onnx: length regulator and reverse flow (`SynthesizerTrn.infer_frames`)
+- decoder.onnx: the `Generator` vocoder
+
+Batch size and sequence lengths are dynamic axes in all of them.
+"""
+import os
+import json
+import torch
+import numpy as np
+from torch import nn
+
+from .models import Generator, append_break_silence
+
+ENCODER_INPUTS = ['x', 'x_lengths', 'sid', 'tone', 'language', 'bert', 'ja_bert', 'length_scale', 'noise_scale_w', 'sdp_ratio']
+ENCODER_OUTPUTS = ['m_p', 'logs_p', 'x_mask', 'w_ceil', 'g']
+FLOW_INPUTS = ['m_p', 'logs_p', 'x_mask', 'w_ceil', 'g', 'noise_scale']
+FLOW_OUTPUTS = ['z', 'y_mask']
+DECODER_INPUTS = ['z', 'g', 'y_mask']
+DECODER_OUTPUTS = ['audio']
+METADATA_FILE = 'melo_onnx.json'
+
+
+class _EncoderGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, x_lengths, sid, tone, language, bert, ja_bert, length_scale, noise_scale_w, sdp_ratio):
+        g = self.model.emb_g(sid).unsqueeze(-1)
+        return self.model.infer_durations(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            length_scale=length_scale,
+            noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio,
+            g=g,
+        )
+
+
+class _FlowGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, m_p, logs_p, x_mask, w_ceil, g, noise_scale):
+        z, y_mask, _ = self.model.infer_frames(m_p, logs_p, x_mask, w_ceil, g, noise_scale=noise_scale)
+        return z * y_mask, y_mask
+
+
+class _DecoderGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, z, g, y_mask):
+        return self.model.dec(z, g=g, x_mask=y_mask)
+
+
+def _hparams_to_dict(hps):
+    return {k: _hparams_to_dict(v) if hasattr(v, 'items') else v for k, v in hps.items()}
+
+
+def export_onnx(model, output_dir, opset_version=17, hps=None):
+    """Export the inference graph of `model` (a `SynthesizerTrn`) to `output_dir`.
+
+    The model is prepared for inference in place first. With `hps` the model config is
+    written next to the graphs as config.json, which `TTS(backend="onnxruntime")` picks
+    up from the same directory.
+    """
+    if model.n_speakers <= 0:
+        raise ValueError("ONNX export needs a multi-speaker model, reference encoders are not supported")
+    model.prepare_for_inference()
+    os.makedirs(output_dir, exist_ok=True)
+    device = next(model.parameters()).device
+    # the example lengths are longer than the attention window, so the relative
+    # position padding is traced
+    batch_size, length = 2, 16
+    x = torch.ones(batch_size, length, dtype=torch.long, device=device)
+    x_lengths = torch.full((batch_size,), length, dtype=torch.long, device=device)
+    sid = torch.zeros(batch_size, dtype=torch.long, device=device)
+    bert = torch.zeros(batch_size, 1024, length, device=device)
+    ja_bert = torch.zeros(batch_size, 768, length, device=device)
+    scalar = lambda value: torch.tensor(value, dtype=torch.float32, device=device)
+
+    with torch.no_grad():
+        encoder_inputs = (x, x_lengths, sid, x, x, bert, ja_bert, scalar(1.), scalar(0.8), scalar(0.2))
+        _export(_EncoderGraph(model), encoder_inputs, os.path.join(output_dir, 'encoder.onnx'),
+                ENCODER_INPUTS, ENCODER_OUTPUTS, opset_version, {
+                    'x': {0: 'batch', 1: 'phones'},
+                    'x_lengths': {0: 'batch'},
+                    'sid': {0: 'batch'},
+                    'tone': {0: 'batch', 1: 'phones'},
+                    'language': {0: 'batch', 1: 'phones'},
+                    'bert': {0: 'batch', 2: 'phones'},
+                    'ja_bert': {0: 'batch', 2: 'phones'},
+                    'm_p': {0: 'batch', 2: 'phones'},
+                    'logs_p': {0: 'batch', 2: 'phones'},
+                    'x_mask': {0: 'batch', 2: 'phones'},
+                    'w_ceil': {0: 'batch', 2: 'phones'},
+                    'g': {0: 'batch'},
+                })
+        m_p, logs_p, x_mask, w_ceil, g = _EncoderGraph(model).eval()(*encoder_inputs)
+        flow_inputs = (m_p, logs_p, x_mask, torch.full_like(w_ceil, 2.), g, scalar(0.667))
+        _export(_FlowGraph(model), flow_inputs, os.path.join(output_dir, 'flow.onnx'),
+                FLOW_INPUTS, FLOW_OUTPUTS, opset_version, {
+                    'm_p': {0: 'batch', 2: 'phones'},
+                    'logs_p': {0: 'batch', 2: 'phones'},
+                    'x_mask': {0: 'batch', 2: 'phones'},
+                    'w_ceil': {0: 'batch', 2: 'phones'},
+                    'g': {0: 'batch'},
+                    'z': {0: 'batch', 2: 'frames'},
+                    'y_mask': {0: 'batch', 2: 'frames'},
+                })
+        z, y_mask = _FlowGraph(model).eval()(*flow_inputs)
+        _export(_DecoderGraph(model), (z, g, y_mask), os.path.join(output_dir, 'decoder.onnx'),
+                DECODER_INPUTS, DECODER_OUTPUTS, opset_version, {
+                    'z': {0: 'batch', 2: 'frames'},
+                    'g': {0: 'batch'},
+                    'y_mask': {0: 'batch', 2: 'frames'},
+                    'audio': {0: 'batch', 2: 'samples'},
+                })
+
+    metadata = {
+        'upsample_factor': model.dec.upsample_factor,
+        'receptive_field': model.dec.receptive_field,
+        'sampling_rate': model.sampling_rate,
+        'spk2id': _hparams_to_dict(model.spk2id) if model.spk2id is not None else None,
+    }
+    with open(os.path.join(output_dir, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    if hps is not None:
+        with open(os.path.join(output_dir, 'config.json'), 'w') as f:
+            json.dump(_hparams_to_dict(hps), f, indent=2, ensure_ascii=False)
+    return output_dir
+
+
+def _export(module, inputs, path, input_names, output_names, opset_version, dynamic_axes):
+    # the exporter restores the training flag of `module` afterwards, so it must
+    # already be in eval mode or the wrapped model is left training
+    torch.onnx.export(
+        module.eval(),
+        inputs,
+        path,
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=opset_version,
+        dynamo=False,
+    )
+
+
+def _to_numpy(tensor, dtype):
+    if isinstance(tensor, torch.Tensor):
+        tensor = tensor.detach().cpu().numpy()
+    return np.ascontiguousarray(tensor, dtype=dtype)
+
+
+def _run(session, input_names, *values):
+    feed = {}
+    for name, value in zip(input_names, values):
+        dtype = np.int64 if name in ('x', 'x_lengths', 'sid', 'tone', 'language') else np.float32
+        feed[name] = _to_numpy(value, dtype)
+    return [torch.from_numpy(o) for o in session.run(None, feed)]
+
+
+class _OnnxDecoder:
+    """The exported `Generator`, with the attributes `TTS` reads from `SynthesizerTrn.dec`."""
+
+    chunked_forward = Generator.chunked_forward
+
+    def __init__(self, session, upsample_factor, receptive_field):
+        self.session = session
+        self.upsample_factor = upsample_factor
+        self.receptive_field = receptive_field
+
+    def forward(self, x, g=None, x_mask=None):
+        if x_mask is None:
+            x_mask = torch.ones(x.size(0), 1, x.size(2))
+        return _run(self.session, DECODER_INPUTS, x, g, x_mask)[0]
+
+    __call__ = forward
+
+
+class OnnxSynthesizer:
+    """Runs the graphs written by `export_onnx` with onnxruntime.
+
+    It implements the parts of the `SynthesizerTrn` interface that `TTS` uses (`infer`,
+    `infer_latent`, `infer_stream` and `dec`) on CPU torch tensors. `sampling_rate` and
+    `spk2id`, used for the SSML break and voice_name attributes, default to the values
+    recorded at export.
+    """
+
+    def __init__(self, onnx_dir, providers=None, sess_options=None, sampling_rate=None, spk2id=None):
+        import onnxruntime
+
+        if providers is None:
+            providers = ['CPUExecutionProvider']
+
+        def load(name):
+            return onnxruntime.InferenceSession(os.path.join(onnx_dir, name), sess_options=sess_options, providers=providers)
+
+        with open(os.path.join(onnx_dir, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        self.encoder = load('encoder.onnx')
+        self.flow = load('flow.onnx')
+        self.dec = _OnnxDecoder(load('decoder.onnx'), metadata['upsample_factor'], metadata['receptive_field'])
+        self.sampling_rate = sampling_rate or metadata.get('sampling_rate', 22050)
+        self.spk2id = spk2id if spk2id is not None else metadata.get('spk2id')
+
+    def infer_latent(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        sdp_ratio=0,
+    ):
+        m_p, logs_p, x_mask, w_ceil, g = _run(
+            self.encoder, ENCODER_INPUTS,
+            x, x_lengths, sid, tone, language, bert, ja_bert, length_scale, noise_scale_w, sdp_ratio,
+        )
+        z, y_mask = _run(self.flow, FLOW_INPUTS, m_p, logs_p, x_mask, w_ceil, g, noise_scale)
+        return z, y_mask, g
+
+    def infer(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        max_len=None,
+        sdp_ratio=0,
+        ssml_attributes=None,
+        chunk_size=None,
+    ):
+        if ssml_attributes is None:
+            ssml_attributes = {}
+        voice_name = ssml_attributes.get('voice_name')
+        if voice_name is not None:
+            if self.spk2id is not None and voice_name in self.spk2id:
+                sid = torch.LongTensor([self.spk2id[voice_name]])
+            else:
+                print(f"Warning: voice name {voice_name} not found, using default speaker")
+        z, y_mask, g = self.infer_latent(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            noise_scale=noise_scale,
+            length_scale=length_scale,
+            noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio,
+        )
+        if chunk_size is None:
+            o = self.dec(z[:, :, :max_len], g=g, x_mask=y_mask[:, :, :max_len])
+        else:
+            o = torch.cat(list(self.dec.chunked_forward(z[:, :, :max_len], g=g, chunk_size=chunk_size, x_mask=y_mask[:, :, :max_len])), dim=-1)
+        o = append_break_silence(o, ssml_attributes, self.sampling_rate)
+        return o, None, y_mask, (z, None, None, None)
+
+    def infer_stream(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        max_len=None,
+        sdp_ratio=0,
+        chunk_size=64,
+    ):
+        z, y_mask, g = self.infer_latent(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            noise_scale=noise_scale,
+            length_scale=length_scale,
+            noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio,
+        )
+        yield from self.dec.chunked_forward(z[:, :, :max_len], g=g, chunk_size=chunk_size, x_mask=y_mask[:, :, :max_len])
@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+def model_footprint(model):
+    """Bytes held by the parameters and buffers of an nn.Module."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        self.nbytes = 0
+        self.last_used = 0.
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded `TTS` models.
+
+    A model is loaded the first time `get` is called for its language/checkpoint and is
+    then shared by every caller. Each entry records when it was last used and how many
+    bytes its weights take; once the total exceeds `memory_budget` bytes the least
+    recently used models are dropped (the model just requested is always kept).
+    `loader` builds a model from the `get` arguments and defaults to `melo.api.TTS`.
+    """
+
+    def __init__(self, memory_budget=None, loader=None):
+        self.memory_budget = memory_budget
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, language, device='auto', use_hf=True, config_path=None, ckpt_path=None):
+        key = (language, device, use_hf, config_path, ckpt_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._entries.move_to_end(key)
+            entry.last_used = time.time()
+
+        with entry.lock:
+            if entry.model is None:
+                loader = self.loader
+                if loader is None:
+                    from melo.api import TTS as loader
+                model = loader(language=language, device=device, use_hf=use_hf, config_path=config_path, ckpt_path=ckpt_path)
+                entry.nbytes = model_footprint(model)
+                entry.model = model
+            model = entry.model
+
+        self._evict(keep=key)
+        return model
+
+    def evict(self, language=None):
+        """Drop every cached model, or only those for `language`."""
+        with self._lock:
+            keys = [key for key in self._entries if language is None or key[0] == language]
+            for key in keys:
+                del self._entries[key]
+        if keys:
+            self._empty_cache()
+
+    def stats(self):
+        with self._lock:
+            return [
+                {'key': key, 'bytes': entry.nbytes, 'last_used': entry.last_used}
+                for key, entry in self._entries.items()
+                if entry.model is not None
+            ]
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values() if entry.model is not None)
+
+    def __contains__(self, language):
+        with self._lock:
+            return any(key[0] == language and entry.model is not None for key, entry in self._entries.items())
+
+    def _evict(self, keep):
+        if self.memory_budget is None:
+            return
+        evicted = False
+        with self._lock:
+            total = sum(entry.nbytes for entry in self._entries.values() if entry.model is not None)
+            for key in list(self._entries):
+                if total <= self.memory_budget:
+                    break
+                entry = self._entries[key]
+                if key == keep or entry.model is None:
+                    continue
+                total -= entry.nbytes
+                del self._entries[key]
+                evicted = True
+        if evicted:
+            self._empty_cache()
+
+    @staticmethod
+    def _empty_cache():
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def _budget_from_env():
+    budget = os.environ.get('MELO_MODEL_MEMORY_BUDGET_MB')
+    return int(budget) * 1024 * 1024 if budget else None
+
+
+registry = ModelRegistry(memory_budget=_budget_from_env())
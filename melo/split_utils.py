@@ -102,64 +102,268 @@ def merge_short_sentences_zh(sens):
 
 
 
-def txtsplit(text, desired_length=100, max_length=200):
-    """Split text it into chunks of a desired length trying to keep sentences intact."""
-    text = re.sub(r'\n\n+', '\n', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[""]', '"', text)
-    text = re.sub(r'([,.?!])', r'\1 ', text)
-    text = re.sub(r'\s+', ' ', text)
-    
-    rv = []
-    in_quote = False
-    current = ""
-    split_pos = []
-    pos = -1
-    end_pos = len(text) - 1
-    def seek(delta):
-        nonlocal pos, in_quote, current
+_TXTSPLIT_EVENT = re.compile(r'[!?\n.,"]|.(?=")', re.DOTALL)
+
+
+class _NeedMore(Exception):
+    pass
+
+
+class TxtSplitter:
+    """`txtsplit` over text that arrives in pieces.
+
+    `feed` takes text that `txtsplit` has already normalized and returns the chunks that are
+    final; `close` returns the rest. A step that has to look past the text seen so far is
+    undone and retried when more arrives, so the chunks are the ones `txtsplit` returns for
+    the whole text. Positions are absolute; the text before the current chunk is dropped,
+    so the work stays linear in the length of the text.
+    """
+
+    def __init__(self, desired_length=100, max_length=200):
+        self.desired_length = desired_length
+        self.max_length = max_length
+        self.text = ""
+        self.offset = 0  # absolute position of self.text[0]
+        self.start = 0  # absolute position where the current chunk starts
+        self.pos = -1
+        self.in_quote = False
+        self.split_pos = []
+        self.final = False
+
+    def _char(self, p):
+        return self.text[p - self.offset]
+
+    def _length(self):
+        return self.offset + len(self.text)
+
+    def _seek(self, delta):
         is_neg = delta < 0
         for _ in range(abs(delta)):
             if is_neg:
-                pos -= 1
-                current = current[:-1]
+                self.pos -= 1
             else:
-                pos += 1
-                current += text[pos]
-            if text[pos] == '"':
-                in_quote = not in_quote
-        return text[pos]
-    def peek(delta):
-        p = pos + delta
-        return text[p] if p < end_pos and p >= 0 else ""
-    def commit():
-        nonlocal rv, current, split_pos
-        rv.append(current)
-        current = ""
-        split_pos = []
-    while pos < end_pos:
-        c = seek(1)
-        if len(current) >= max_length:
-            if len(split_pos) > 0 and len(current) > (desired_length / 2):
-                d = pos - split_pos[-1]
-                seek(-d)
+                if self.pos + 1 >= self._length():
+                    raise _NeedMore
+                self.pos += 1
+            if self._char(self.pos) == '"':
+                self.in_quote = not self.in_quote
+        return self._char(self.pos)
+
+    def _peek(self, delta):
+        p = self.pos + delta
+        end_pos = self._length() - 1
+        if not self.final and p >= end_pos:
+            raise _NeedMore
+        return self._char(p) if p < end_pos and p >= 0 else ""
+
+    def _not_at_end(self):
+        if not self.final and self.pos >= self._length() - 1:
+            raise _NeedMore
+        return self.pos < self._length() - 1
+
+    def _commit(self, rv):
+        rv.append(self.text[self.start - self.offset:self.pos + 1 - self.offset])
+        self.start = self.pos + 1
+        self.split_pos = []
+
+    def _step(self, rv):
+        c = self._seek(1)
+        current_len = self.pos + 1 - self.start
+        if current_len >= self.max_length:
+            if len(self.split_pos) > 0 and current_len > (self.desired_length / 2):
+                d = self.pos - self.split_pos[-1]
+                self._seek(-d)
             else:
-                while c not in '!?.\n ' and pos > 0 and len(current) > desired_length:
-                    c = seek(-1)
-            commit()
-        elif not in_quote and (c in '!?\n' or (c in '.,' and peek(1) in '\n ')):
-            while pos < len(text) - 1 and len(current) < max_length and peek(1) in '!?.':
-                c = seek(1)
-            split_pos.append(pos)
-            if len(current) >= desired_length:
-                commit()
-        elif in_quote and peek(1) == '"' and peek(2) in '\n ':
-            seek(2)
-            split_pos.append(pos)
-    rv.append(current)
+                while c not in '!?.\n ' and self.pos > 0 and self.pos + 1 - self.start > self.desired_length:
+                    c = self._seek(-1)
+            self._commit(rv)
+        elif not self.in_quote and (c in '!?\n' or (c in '.,' and self._peek(1) in '\n ')):
+            while self._not_at_end() and self.pos + 1 - self.start < self.max_length and self._peek(1) in '!?.':
+                c = self._seek(1)
+            self.split_pos.append(self.pos)
+            if self.pos + 1 - self.start >= self.desired_length:
+                self._commit(rv)
+        elif self.in_quote and self._peek(1) == '"' and self._peek(2) in '\n ':
+            self._seek(2)
+            self.split_pos.append(self.pos)
+
+    def _run(self):
+        rv = []
+        while self.pos < self._length() - 1:
+            # characters that are not punctuation, a quote or just before one, and that leave
+            # the chunk under max_length, change nothing: skip straight past them
+            end = min(self.start + self.max_length - 1, self._length() - (not self.final))
+            m = _TXTSPLIT_EVENT.search(self.text, self.pos + 1 - self.offset, end + 1 - self.offset)
+            self.pos = max(self.pos, min(m.start() + self.offset if m else end, end) - 1)
+            if self.pos >= self._length() - 1:
+                break
+            state = (self.pos, self.in_quote, self.start, self.split_pos, len(self.split_pos))
+            try:
+                self._step(rv)
+            except _NeedMore:
+                self.pos, self.in_quote, self.start, self.split_pos, n = state
+                del self.split_pos[n:]
+                break
+        # nothing before the current chunk is looked at again
+        self.text = self.text[self.start - self.offset:]
+        self.offset = self.start
+        return rv
+
+    def feed(self, text):
+        self.text += text
+        return self._run()
+
+    def close(self):
+        self.final = True
+        rv = self._run()
+        rv.append(self.text[self.start - self.offset:self.pos + 1 - self.offset])
+        return rv
+
+
+def _keep_chunks(rv):
     rv = [s.strip() for s in rv]
-    rv = [s for s in rv if len(s) > 0 and not re.match(r'^[\s\.,;:!?]*$', s)]
-    return rv
+    return [s for s in rv if len(s) > 0 and not re.match(r'^[\s\.,;:!?]*$', s)]
+
+
+def _normalize_txtsplit(text):
+    text = re.sub(r'\n\n+', '\n', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[""]', '"', text)
+    text = re.sub(r'([,.?!])', r'\1 ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text
+
+
+def txtsplit(text, desired_length=100, max_length=200):
+    """Split text it into chunks of a desired length trying to keep sentences intact."""
+    splitter = TxtSplitter(desired_length, max_length)
+    rv = splitter.feed(_normalize_txtsplit(text))
+    rv += splitter.close()
+    return _keep_chunks(rv)
+
+
+_LATIN_TABLE = str.maketrans({
+    **{c: '.' for c in '。！？；'}, '，': ',', '“': '', '”': '', '‘': "'", '’': "'",
+    **{c: '' for c in '<>()[]"«»'},
+})
+_ZH_TABLE = str.maketrans({**{c: '.' for c in '。！？；'}, '，': ','})
+
+
+class SentenceSplitter:
+    """Incremental `split_sentence` for text that arrives in fragments, such as LLM tokens.
+
+    `feed` returns the sentences that more text can no longer change, `flush` the rest once
+    the text is complete. Together they return what `split_sentence` returns for the whole
+    text, in time linear in its length.
+
+    Example:
+        >>> splitter = SentenceSplitter(language_str='EN')
+        >>> for token in tokens:
+        ...     for sentence in splitter.feed(token):
+        ...         synthesize(sentence)
+        >>> for sentence in splitter.flush():
+        ...     synthesize(sentence)
+    """
+
+    def __init__(self, language_str='EN', min_len=10):
+        self.latin = language_str in ['EN', 'FR', 'ES', 'SP']
+        self.min_len = min_len
+        self.pending_space = False
+        if self.latin:
+            self.splitter = TxtSplitter(256, 512)
+        else:
+            self.piece = []  # characters of the sentence piece being read
+            self.piece_chars = 0  # its non-whitespace characters
+            self.pieces = []  # finished pieces not yet grouped
+            self.count_len = 0
+            self.sens_out = []  # groups that a later merge may still change
+
+    def feed(self, text):
+        if self.latin:
+            return _keep_chunks(self.splitter.feed(self._normalize_latin(text)))
+        for c in text.translate(_ZH_TABLE):
+            if c in '\n\t ':
+                self.pending_space = True
+                continue
+            if self.pending_space:
+                self.piece.append(' ')
+                self.pending_space = False
+            self.piece.append(c)
+            self.piece_chars += not c.isspace()
+            if c in ',.!?;':
+                self._add_piece(''.join(self.piece).strip())
+                self.piece, self.piece_chars = [], 0
+        return self._pop_final()
+
+    def flush(self):
+        if self.latin:
+            rv = self.splitter.feed(' ' if self.pending_space else '') + self.splitter.close()
+            self.splitter, self.pending_space = TxtSplitter(256, 512), False
+            return _keep_chunks(rv)
+        piece = ''.join(self.piece).strip()
+        if piece:
+            self._add_piece(piece)
+        if self.pieces:
+            self._add_group()
+        sens_out = self.sens_out
+        try:
+            if len(sens_out[-1]) <= 2:
+                sens_out[-2] = sens_out[-2] + " " + sens_out[-1]
+                sens_out.pop(-1)
+        except:
+            pass
+        self.piece, self.piece_chars, self.pieces, self.count_len, self.sens_out = [], 0, [], 0, []
+        return sens_out
+
+    def _normalize_latin(self, text):
+        # `split_sentences_latin` and `txtsplit` clean-ups, one character at a time: whitespace
+        # runs become one space, and ,.?! are followed by exactly one space
+        out = []
+        for c in text.translate(_LATIN_TABLE):
+            if c.isspace():
+                self.pending_space = True
+                continue
+            if self.pending_space:
+                out.append(' ')
+            out.append(c)
+            self.pending_space = c in ',.?!'
+        return ''.join(out)
+
+    def _add_piece(self, piece):
+        self.pieces.append(piece)
+        self.count_len += len(piece)
+        if self.count_len > self.min_len:
+            self._add_group()
+
+    def _add_group(self):
+        sent = ' '.join(self.pieces)
+        self.pieces, self.count_len = [], 0
+        # merge_short_sentences_zh
+        if len(self.sens_out) > 0 and len(self.sens_out[-1]) <= 2:
+            self.sens_out[-1] = self.sens_out[-1] + " " + sent
+        else:
+            self.sens_out.append(sent)
+
+    def _pop_final(self):
+        # only the last group grows, and at the end a last group of <= 2 characters joins the
+        # one before it; text still to be grouped makes either impossible
+        pending_len = self.count_len + self.piece_chars
+        n = len(self.sens_out) - 2
+        if self.sens_out and (len(self.sens_out[-1]) > 2 or pending_len > 0):
+            n += 1
+            if len(self.sens_out[-1]) > 2 and pending_len > 2:
+                n += 1
+        n = max(n, 0)
+        final, self.sens_out = self.sens_out[:n], self.sens_out[n:]
+        return final
+
+
+def split_sentence_stream(fragments, min_len=10, language_str='EN'):
+    """Yield the sentences of the text made of `fragments` as soon as they are final."""
+    splitter = SentenceSplitter(language_str, min_len)
+    for fragment in fragments:
+        yield from splitter.feed(fragment)
+    yield from splitter.flush()
 
 
 if __name__ == '__main__':
@@ -13,7 +13,7 @@ from melo.text.text_processing import (
     cleaned_text_to_sequence
 )
 from melo.text.cleaners import english_cleaners2 as _clean_text
-from melo.text.bert_utils import get_bert
+from melo.text.bert_utils import get_bert, get_bert_batch
 
 __all__ = [
     'symbols',
@@ -27,7 +27,8 @@ __all__ = [
     'sequence_to_text',
     'cleaned_text_to_sequence',
     '_clean_text',
-    'get_bert'
+    'get_bert',
+    'get_bert_batch'
 ]
 
 _symbol_to_id = {s: i for i, s in enumerate(symbols)}
@@ -0,0 +1,142 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+class BertFeatureCache:
+    """LRU cache of phone-level BERT features keyed by (model id, normalized text, word2ph).
+
+    Entries are kept in memory up to `max_bytes`. With `cache_dir` set, every computed
+    feature is also written there as a .npy file and memory misses fall back to it; disk
+    entries are opened memory-mapped (copy-on-write), so worker processes share the
+    pages through the OS page cache. The disk store is trimmed to `max_disk_bytes`,
+    oldest-used first. Returned tensors are shared with the cache and must not be
+    modified in place.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk_bytes = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @staticmethod
+    def make_key(model_id, text, word2ph):
+        raw = "\0".join([model_id, text, ",".join(map(str, word2ph))])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, model_id, text, word2ph):
+        key = self.make_key(model_id, text, word2ph)
+        with self._lock:
+            feature = self._entries.get(key)
+            if feature is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return feature
+        feature = self._load(key)
+        with self._lock:
+            if feature is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, feature)
+        return feature
+
+    def put(self, model_id, text, word2ph, feature):
+        key = self.make_key(model_id, text, word2ph)
+        with self._lock:
+            self._remember(key, feature)
+        self._save(key, feature)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+            }
+
+    def _remember(self, key, feature):
+        if key in self._entries:
+            return
+        size = feature.numel() * feature.element_size()
+        if size > self.max_bytes:
+            return
+        self._entries[key] = feature
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.numel() * old.element_size()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode="c")
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)
+        return torch.from_numpy(array)
+
+    def _save(self, key, feature):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, feature.detach().cpu().float().numpy())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.disk_bytes += os.path.getsize(path)
+            if self.max_disk_bytes is not None and self.disk_bytes > self.max_disk_bytes:
+                self._trim_disk()
+
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        return files
+
+    def _trim_disk(self):
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.disk_bytes = total
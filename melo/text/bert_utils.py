@@ -1,39 +1,211 @@
+import os
+import sys
+import functools
+import threading
 import torch
-from transformers import AutoTokenizer, AutoModel
+from .bert_cache import BertFeatureCache
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _cache_from_env():
+    max_mb = int(os.environ.get("MELO_BERT_CACHE_MB", 64))
+    if max_mb <= 0:
+        return None
+    disk_mb = os.environ.get("MELO_BERT_CACHE_DISK_MB")
+    return BertFeatureCache(
+        max_bytes=max_mb * 1024 * 1024,
+        cache_dir=os.environ.get("MELO_BERT_CACHE_DIR"),
+        max_disk_bytes=int(disk_mb) * 1024 * 1024 if disk_mb else None,
+    )
+
+
+bert_cache = _cache_from_env()
+
+
+def configure_bert_cache(max_bytes=64 * 1024 * 1024, cache_dir=None, max_disk_bytes=None):
+    """Replace the process-wide phone-level feature cache; `max_bytes=0` disables it."""
+    global bert_cache
+    bert_cache = BertFeatureCache(max_bytes, cache_dir, max_disk_bytes) if max_bytes > 0 else None
+    return bert_cache
+
+
+def resolve_device(device):
+    if (
+        sys.platform == "darwin"
+        and torch.backends.mps.is_available()
+        and device == "cpu"
+    ):
+        device = "mps"
+    if not device:
+        device = "cuda"
+    return device
+
+
+class BertFeatureExtractor:
+    """The embeddings and encoder layers of `model_id` up to hidden state `layer`, on one device.
+
+    `layer` indexes `hidden_states` as returned with `output_hidden_states=True`
+    (0 is the embedding output, -1 the last encoder layer). Only the layers needed to
+    produce it are built and loaded, and the masked-LM head and pooler are skipped, so
+    the extractor's last hidden state is exactly that entry of the full model.
+
+    Instances are created through `get_extractor`, which keeps exactly one per
+    (model id, device, layer) for the whole process. Calls are serialized with a lock,
+    so an extractor can be shared by threads.
+    """
+
+    def __init__(self, model_id, device, layer=-3):
+        from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+        self.model_id = model_id
+        self.device = device
+        self.layer = layer
+        config = AutoConfig.from_pretrained(model_id)
+        if layer < 0:
+            layer += config.num_hidden_layers + 1
+        assert 0 <= layer <= config.num_hidden_layers, f"{model_id} has no hidden state {self.layer}"
+        config.num_hidden_layers = layer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModel.from_pretrained(model_id, config=config, add_pooling_layer=False).to(device)
+        self.model.eval()
+        self.lock = threading.Lock()
+
+    def __call__(self, text):
+        """Hidden state `layer` for `text`, as a [n_tokens, hidden] CPU tensor."""
+        with self.lock, torch.no_grad():
+            inputs = self.tokenizer(text, return_tensors="pt")
+            for i in inputs:
+                inputs[i] = inputs[i].to(self.device)
+            res = self.model(**inputs)
+            return res.last_hidden_state[0].cpu()
+
+    def batch(self, texts):
+        """Like `__call__` for several texts at once: one padded forward pass, one tensor per text."""
+        with self.lock, torch.no_grad():
+            inputs = self.tokenizer(texts, padding=True, return_tensors="pt")
+            for i in inputs:
+                inputs[i] = inputs[i].to(self.device)
+            res = self.model(**inputs)
+            hidden = res.last_hidden_state.cpu()
+            mask = inputs["attention_mask"].cpu().bool()
+            return [hidden[i][mask[i]] for i in range(len(texts))]
+
+
+def get_extractor(model_id, device, layer=-3):
+    key = (model_id, str(device), layer)
+    extractor = _extractors.get(key)
+    if extractor is None:
+        with _extractors_lock:
+            extractor = _extractors.get(key)
+            if extractor is None:
+                extractor = _extractors[key] = BertFeatureExtractor(model_id, device, layer)
+    return extractor
+
+
+def get_tokenizer(model_id):
+    """The frontend tokenizer of `model_id`, loaded on first use and shared by the whole process."""
+    tokenizer = _tokenizers.get(model_id)
+    if tokenizer is None:
+        with _tokenizers_lock:
+            tokenizer = _tokenizers.get(model_id)
+            if tokenizer is None:
+                from transformers import AutoTokenizer
+
+                tokenizer = _tokenizers[model_id] = AutoTokenizer.from_pretrained(model_id)
+    return tokenizer
+
+
+def lazy_tokenizer(model_id):
+    """A `get_tokenizer()` for a language frontend: loads the tokenizer of `model_id` on its first call."""
+    return functools.partial(get_tokenizer, model_id)
+
+
+def distribute_phone(n_phone, n_word):
+    """Spread `n_phone` phones as evenly as possible over the `n_word` tokens of a word."""
+    phones_per_word = [0] * n_word
+    for task in range(n_phone):
+        min_tasks = min(phones_per_word)
+        min_index = phones_per_word.index(min_tasks)
+        phones_per_word[min_index] += 1
+    return phones_per_word
+
+
+def expand_to_phones(word_features, word2ph, out=None):
+    """Repeat row i of `word_features` ([n_words, hidden]) `word2ph[i]` times, as [hidden, sum(word2ph)].
+
+    Rows past `len(word2ph)` are ignored. The result is gathered in a single
+    `index_select`; pass `out` (a [hidden, sum(word2ph)] tensor) to write into a
+    preallocated buffer instead.
+    """
+    repeats = torch.as_tensor(word2ph, dtype=torch.long, device=word_features.device)
+    index = torch.repeat_interleave(torch.arange(len(repeats), device=word_features.device), repeats)
+    return torch.index_select(word_features.T, 1, index, out=out)
+
+
+def get_phone_level_feature(model_id, text, word2ph, device=None, check_length=True):
+    """Features of layer -3 of `model_id`, each token repeated `word2ph[i]` times, as [hidden, n_phones].
+
+    Results go through the process-wide `bert_cache`, so repeated sentences skip the
+    transformer.
+    """
+    return get_phone_level_features(model_id, [(text, word2ph)], device, check_length)[0]
+
+
+def get_phone_level_features(model_id, items, device=None, check_length=True):
+    """`get_phone_level_feature` for a list of (text, word2ph) pairs.
+
+    Cache misses are tokenized together and run through the model in a single padded
+    forward pass.
+    """
+    cache = bert_cache
+    features = [None] * len(items)
+    missing = []
+    for i, (text, word2ph) in enumerate(items):
+        if cache is not None:
+            features[i] = cache.get(model_id, text, word2ph)
+        if features[i] is None:
+            missing.append(i)
+    if not missing:
+        return features
+
+    extractor = get_extractor(model_id, resolve_device(device))
+    if len(missing) == 1:
+        hidden = [extractor(items[missing[0]][0])]
+    else:
+        hidden = extractor.batch([items[i][0] for i in missing])
+    for i, res in zip(missing, hidden):
+        text, word2ph = items[i]
+        if check_length:
+            assert res.shape[0] == len(word2ph), f"{res.shape[0]}/{len(word2ph)}"
+        features[i] = expand_to_phones(res, word2ph)
+        if cache is not None:
+            cache.put(model_id, text, word2ph, features[i])
+    return features
+
 
 def get_bert_feature(text, token_idx_list, device):
     """Get BERT features for the text"""
-    tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
-    model = AutoModel.from_pretrained("bert-base-uncased").to(device)
-    
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    
-    with torch.no_grad():
-        outputs = model(**inputs)
-        last_hidden_states = outputs.last_hidden_state[0]
-        
-    features = []
-    for idx in token_idx_list:
-        if idx < last_hidden_states.shape[0]:
-            features.append(last_hidden_states[idx])
-        else:
-            features.append(torch.zeros_like(last_hidden_states[0]))
-            
-    return torch.stack(features)
+    last_hidden_states = get_extractor("bert-base-uncased", device, layer=-1)(text)
+
+    index = torch.as_tensor(token_idx_list, dtype=torch.long)
+    valid = index < last_hidden_states.shape[0]
+    features = last_hidden_states[torch.where(valid, index, 0)]
+    features[~valid] = 0
+    return features
 
 def get_bert(text, word2ph, language, device):
-    """Get BERT features for text with word-to-phoneme mapping"""
-    if language == "ZH":
-        bert_features = get_bert_feature(text, list(range(len(text))), device)
-    else:
-        words = text.split(" ")
-        bert_features = get_bert_feature(text, list(range(len(words))), device)
-    
-    bert = []
-    for i, w2p in enumerate(word2ph):
-        for j in range(w2p):
-            bert.append(bert_features[i])
-    bert = torch.stack(bert, dim=0).transpose(0, 1)
-    
-    return bert
+    """Get phone-level BERT features for text with word-to-phoneme mapping"""
+    from .cleaner import language_module_map
+
+    return language_module_map[language].get_bert_feature(text, word2ph, device=device)
+
+
+def get_bert_batch(items, language, device):
+    """`get_bert` for a list of (text, word2ph) pairs, batched into one forward pass"""
+    from .cleaner import language_module_map
+
+    return language_module_map[language].get_bert_features(items, device=device)
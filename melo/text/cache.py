@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping shared by threads; the least recently used entries are evicted.
+
+    Values are returned as stored, so they should be immutable (tuples, strings).
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._data))
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        self.update([(key, value)])
+
+    def update(self, items):
+        with self._lock:
+            for key, value in items:
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_many(self, keys, compute):
+        """Values for `keys`, in order.
+
+        The distinct keys that miss are passed to `compute` in a single call, which
+        returns their values in the same order; those are stored before returning.
+        """
+        results = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    results[key] = self._data[key]
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing:
+            values = list(compute(missing))
+            results.update(zip(missing, values))
+            self.update(zip(missing, values))
+        return [results[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -1,11 +1,15 @@
 import os
 import re
+import marshal
+import tempfile
+import functools
 
 import cn2an
 from pypinyin import lazy_pinyin, Style
 
 from .symbols import punctuation
 from .tone_sandhi import ToneSandhi
+from .cache import LRUCache
 
 current_file_path = os.path.dirname(__file__)
 pinyin_to_symbol_map = {
@@ -13,8 +17,13 @@ pinyin_to_symbol_map = {
     for line in open(os.path.join(current_file_path, "opencpop-strict.txt")).readlines()
 }
 
+import jieba
 import jieba.posseg as psg
 
+# `warm_up` has jieba serialize its prefix dictionary here after building it once;
+# point every worker (or a prebuilt model store) at the same directory to skip the build.
+JIEBA_CACHE_DIR = os.environ.get("MELO_JIEBA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "melo"))
+
 
 rep_map = {
     "：": ",",
@@ -65,16 +74,26 @@ def replace_punctuation(text):
     return replaced_text
 
 
-def g2p(text):
+def _split_sentences(text):
     pattern = r"(?<=[{0}])\s*".format("".join(punctuation))
-    sentences = [i for i in re.split(pattern, text) if i.strip() != ""]
-    phones, tones, word2ph = _g2p(sentences)
-    assert sum(word2ph) == len(phones)
-    assert len(word2ph) == len(text)  # Sometimes it will crash,you can add a try-catch.
-    phones = ["_"] + phones + ["_"]
-    tones = [0] + tones + [0]
-    word2ph = [1] + word2ph + [1]
-    return phones, tones, word2ph
+    return [i for i in re.split(pattern, text) if i.strip() != ""]
+
+
+def g2p_batch(texts):
+    """`g2p` for several texts; the sentences of all of them are segmented in one jieba pass."""
+    results = []
+    for text, (phones, tones, word2ph) in zip(texts, _g2p_batch([_split_sentences(text) for text in texts])):
+        assert sum(word2ph) == len(phones)
+        assert len(word2ph) == len(text)  # Sometimes it will crash,you can add a try-catch.
+        phones = ["_"] + phones + ["_"]
+        tones = [0] + tones + [0]
+        word2ph = [1] + word2ph + [1]
+        results.append((phones, tones, word2ph))
+    return results
+
+
+def g2p(text):
+    return g2p_batch([text])[0]
 
 
 def _get_initials_finals(word):
@@ -90,82 +109,177 @@ def _get_initials_finals(word):
     return initials, finals
 
 
-def _g2p(segments):
-    phones_list = []
-    tones_list = []
-    word2ph = []
+WORD_CACHE_SIZE = int(os.environ.get("MELO_ZH_WORD_CACHE_SIZE", 100000))
+
+
+@functools.lru_cache(maxsize=WORD_CACHE_SIZE)
+def word_initials_finals(word, pos):
+    """(initials, finals after tone sandhi) of one segmented word, memoized per (word, POS)."""
+    initials, finals = _get_initials_finals(word)
+    finals = tone_modifier.modified_tone(word, pos, finals)
+    return tuple(initials), tuple(finals)
+
+
+_cut_cache = LRUCache(WORD_CACHE_SIZE)
+
+
+def cut_segments(segments):
+    """(word, POS) pairs of every segment, as `psg.lcut` would give them.
+
+    Segments seen before come from a bounded LRU. The rest are segmented in a single
+    jieba pass over their newline-joined concatenation: jieba always breaks at a
+    newline, so the words are the same as cutting each segment on its own. If the
+    words ever do not line up with the segments they are cut one by one instead.
+    """
+    return [list(seg_cut) for seg_cut in _cut_cache.get_many(segments, _cut_missing)]
+
+
+def _cut_missing(segments):
+    words = psg.lcut("\n".join(segments))
+    cuts = []
+    i = 0
     for seg in segments:
-        # Replace all English words in the sentence
-        seg = re.sub("[a-zA-Z]+", "", seg)
-        seg_cut = psg.lcut(seg)
-        initials = []
-        finals = []
-        seg_cut = tone_modifier.pre_merge_for_modify(seg_cut)
-        for word, pos in seg_cut:
-            if pos == "eng":
-                import pdb; pdb.set_trace()
-                continue
-            sub_initials, sub_finals = _get_initials_finals(word)
-            sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
-            initials.append(sub_initials)
-            finals.append(sub_finals)
-
-            # assert len(sub_initials) == len(sub_finals) == len(word)
-        initials = sum(initials, [])
-        finals = sum(finals, [])
-        #
-        for c, v in zip(initials, finals):
-            raw_pinyin = c + v
-            # NOTE: post process for pypinyin outputs
-            # we discriminate i, ii and iii
-            if c == v:
-                assert c in punctuation
-                phone = [c]
-                tone = "0"
-                word2ph.append(1)
+        seg_cut, pos = [], 0
+        while pos < len(seg) and i < len(words):
+            seg_cut.append(words[i])
+            pos += len(words[i].word)
+            i += 1
+        if pos != len(seg) or (i < len(words) and words[i].word != "\n"):
+            cuts = [psg.lcut(seg) for seg in segments]
+            break
+        i += 1  # the newline between segments
+        cuts.append(seg_cut)
+    return [tuple((w.word, w.flag) for w in seg_cut) for seg_cut in cuts]
+
+
+_syllable_table = {}
+
+
+def syllable_to_phones(c, v):
+    """Symbols and tone of one pypinyin syllable (initial `c`, final with tone `v`).
+
+    The rewrite from pypinyin output to `pinyin_to_symbol_map` keys runs once per
+    distinct syllable; after that this is a single dict lookup.
+    """
+    res = _syllable_table.get((c, v))
+    if res is not None:
+        return res
+    raw_pinyin = c + v
+    # NOTE: post process for pypinyin outputs
+    # we discriminate i, ii and iii
+    if c == v:
+        assert c in punctuation
+        phone = [c]
+        tone = "0"
+    else:
+        v_without_tone = v[:-1]
+        tone = v[-1]
+
+        pinyin = c + v_without_tone
+        assert tone in "12345"
+
+        if c:
+            # 多音节
+            v_rep_map = {
+                "uei": "ui",
+                "iou": "iu",
+                "uen": "un",
+            }
+            if v_without_tone in v_rep_map.keys():
+                pinyin = c + v_rep_map[v_without_tone]
+        else:
+            # 单音节
+            pinyin_rep_map = {
+                "ing": "ying",
+                "i": "yi",
+                "in": "yin",
+                "u": "wu",
+            }
+            if pinyin in pinyin_rep_map.keys():
+                pinyin = pinyin_rep_map[pinyin]
             else:
-                v_without_tone = v[:-1]
-                tone = v[-1]
-
-                pinyin = c + v_without_tone
-                assert tone in "12345"
-
-                if c:
-                    # 多音节
-                    v_rep_map = {
-                        "uei": "ui",
-                        "iou": "iu",
-                        "uen": "un",
-                    }
-                    if v_without_tone in v_rep_map.keys():
-                        pinyin = c + v_rep_map[v_without_tone]
-                else:
-                    # 单音节
-                    pinyin_rep_map = {
-                        "ing": "ying",
-                        "i": "yi",
-                        "in": "yin",
-                        "u": "wu",
-                    }
-                    if pinyin in pinyin_rep_map.keys():
-                        pinyin = pinyin_rep_map[pinyin]
-                    else:
-                        single_rep_map = {
-                            "v": "yu",
-                            "e": "e",
-                            "i": "y",
-                            "u": "w",
-                        }
-                        if pinyin[0] in single_rep_map.keys():
-                            pinyin = single_rep_map[pinyin[0]] + pinyin[1:]
-
-                assert pinyin in pinyin_to_symbol_map.keys(), (pinyin, seg, raw_pinyin)
-                phone = pinyin_to_symbol_map[pinyin].split(" ")
-                word2ph.append(len(phone))
-
-            phones_list += phone
-            tones_list += [int(tone)] * len(phone)
-    return phones_list, tones_list, word2ph
+                single_rep_map = {
+                    "v": "yu",
+                    "e": "e",
+                    "i": "y",
+                    "u": "w",
+                }
+                if pinyin[0] in single_rep_map.keys():
+                    pinyin = single_rep_map[pinyin[0]] + pinyin[1:]
+
+        assert pinyin in pinyin_to_symbol_map.keys(), (pinyin, raw_pinyin)
+        phone = pinyin_to_symbol_map[pinyin].split(" ")
+    res = _syllable_table[(c, v)] = (tuple(phone), int(tone))
+    return res
+
+
+def _cut_to_phones(seg_cut, phones_list, tones_list, word2ph):
+    initials = []
+    finals = []
+    seg_cut = tone_modifier.pre_merge_for_modify(seg_cut)
+    for word, pos in seg_cut:
+        if pos == "eng":
+            import pdb; pdb.set_trace()
+            continue
+        sub_initials, sub_finals = word_initials_finals(word, pos)
+        initials += sub_initials
+        finals += sub_finals
+
+        # assert len(sub_initials) == len(sub_finals) == len(word)
+    #
+    for c, v in zip(initials, finals):
+        phone, tone = syllable_to_phones(c, v)
+        word2ph.append(len(phone))
+        phones_list += phone
+        tones_list += [tone] * len(phone)
+
+
+def _g2p_batch(segment_lists):
+    """`_g2p` for several lists of segments, with one `cut_segments` call for all of them."""
+    # Replace all English words in the sentence
+    segment_lists = [[re.sub("[a-zA-Z]+", "", seg) for seg in segments] for segments in segment_lists]
+    seg_cuts = iter(cut_segments([seg for segments in segment_lists for seg in segments]))
+    results = []
+    for segments in segment_lists:
+        phones_list = []
+        tones_list = []
+        word2ph = []
+        for _ in segments:
+            _cut_to_phones(next(seg_cuts), phones_list, tones_list, word2ph)
+        results.append((phones_list, tones_list, word2ph))
+    return results
+
+
+def _g2p(segments):
+    return _g2p_batch([segments])[0]
+
+
+def build_jieba_cache(cache_dir=None):
+    """Write jieba's serialized prefix dictionary to `cache_dir` (default `JIEBA_CACHE_DIR`).
+
+    Ship the directory with the model store and set MELO_JIEBA_CACHE_DIR to it, and no
+    process has to build the dictionary again.
+    """
+    cache_dir = cache_dir or JIEBA_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    jieba.dt.tmp_dir = cache_dir
+    jieba.dt.initialize()
+    cache_file = os.path.join(cache_dir, "jieba.cache")
+    if not os.path.exists(cache_file):
+        # already initialized from somewhere else; write the same marshal dump jieba reads
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump((jieba.dt.FREQ, jieba.dt.total), f)
+        os.replace(tmp_path, cache_file)
+    return cache_file
+
+
+def warm_up():
+    try:
+        build_jieba_cache()
+    except OSError:
+        # cache directory not writable, jieba falls back to its own temp dir
+        jieba.dt.initialize()
 
 
 def text_normalize(text):
@@ -177,11 +291,17 @@ def text_normalize(text):
 
 
 def get_bert_feature(text, word2ph, device=None):
-    from text import chinese_bert
+    from . import chinese_bert
 
     return chinese_bert.get_bert_feature(text, word2ph, device=device)
 
 
+def get_bert_features(items, device=None):
+    from . import chinese_bert
+
+    return chinese_bert.get_bert_features(items, device=device)
+
+
 if __name__ == "__main__":
     from text.chinese_bert import get_bert_feature
 
@@ -8,7 +8,8 @@ from pypinyin import lazy_pinyin, Style
 from .symbols import language_tone_start_map
 from .tone_sandhi import ToneSandhi
 from .english import g2p as g2p_en
-from transformers import AutoTokenizer
+from .chinese import cut_segments, syllable_to_phones, word_initials_finals
+from .bert_utils import lazy_tokenizer
 
 punctuation = ["!", "?", "…", ",", ".", "'", "-"]
 current_file_path = os.path.dirname(__file__)
@@ -66,16 +67,12 @@ def replace_punctuation(text):
     return replaced_text
 
 
-def g2p(text, impl='v2'):
+def _split_sentences(text):
     pattern = r"(?<=[{0}])\s*".format("".join(punctuation))
-    sentences = [i for i in re.split(pattern, text) if i.strip() != ""]
-    if impl == 'v1':
-        _func = _g2p
-    elif impl == 'v2':
-        _func = _g2p_v2
-    else:
-        raise NotImplementedError()
-    phones, tones, word2ph = _func(sentences)
+    return [i for i in re.split(pattern, text) if i.strip() != ""]
+
+
+def _pad(phones, tones, word2ph):
     assert sum(word2ph) == len(phones)
     # assert len(word2ph) == len(text)  # Sometimes it will crash,you can add a try-catch.
     phones = ["_"] + phones + ["_"]
@@ -84,6 +81,20 @@ def g2p(text, impl='v2'):
     return phones, tones, word2ph
 
 
+def g2p_batch(texts):
+    """`g2p` (v2) for several texts; the Chinese runs of all of them are segmented in one jieba pass."""
+    return [_pad(*result) for result in _g2p_v2_batch([_split_sentences(text) for text in texts])]
+
+
+def g2p(text, impl='v2'):
+    if impl == 'v1':
+        return _pad(*_g2p(_split_sentences(text)))
+    elif impl == 'v2':
+        return g2p_batch([text])[0]
+    else:
+        raise NotImplementedError()
+
+
 def _get_initials_finals(word):
     initials = []
     finals = []
@@ -97,35 +108,33 @@ def _get_initials_finals(word):
     return initials, finals
 
 model_id = 'bert-base-multilingual-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+get_tokenizer = lazy_tokenizer(model_id)
+
+
 def _g2p(segments):
     phones_list = []
     tones_list = []
     word2ph = []
-    for seg in segments:
-        # Replace all English words in the sentence
-        # seg = re.sub("[a-zA-Z]+", "", seg)
-        seg_cut = psg.lcut(seg)
+    # Replace all English words in the sentence
+    # seg = re.sub("[a-zA-Z]+", "", seg)
+    for seg_cut in cut_segments(segments):
         initials = []
         finals = []
         seg_cut = tone_modifier.pre_merge_for_modify(seg_cut)
         for word, pos in seg_cut:
             if pos == "eng":
-                initials.append(['EN_WORD'])
-                finals.append([word])
+                initials.append('EN_WORD')
+                finals.append(word)
             else:
-                sub_initials, sub_finals = _get_initials_finals(word)
-                sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
-                initials.append(sub_initials)
-                finals.append(sub_finals)
+                sub_initials, sub_finals = word_initials_finals(word, pos)
+                initials += sub_initials
+                finals += sub_finals
 
             # assert len(sub_initials) == len(sub_finals) == len(word)
-        initials = sum(initials, [])
-        finals = sum(finals, [])
         #
         for c, v in zip(initials, finals):
             if c == 'EN_WORD':
-                tokenized_en = tokenizer.tokenize(v)
+                tokenized_en = get_tokenizer().tokenize(v)
                 phones_en, tones_en, word2ph_en = g2p_en(text=None, pad_start_end=False, tokenized=tokenized_en)
                 # apply offset to tones_en
                 tones_en = [t + language_tone_start_map['EN'] for t in tones_en]
@@ -133,59 +142,21 @@ def _g2p(segments):
                 tones_list += tones_en
                 word2ph += word2ph_en
             else:
-                raw_pinyin = c + v
-                # NOTE: post process for pypinyin outputs
-                # we discriminate i, ii and iii
-                if c == v:
-                    assert c in punctuation
-                    phone = [c]
-                    tone = "0"
-                    word2ph.append(1)
-                else:
-                    v_without_tone = v[:-1]
-                    tone = v[-1]
-
-                    pinyin = c + v_without_tone
-                    assert tone in "12345"
-
-                    if c:
-                        # 多音节
-                        v_rep_map = {
-                            "uei": "ui",
-                            "iou": "iu",
-                            "uen": "un",
-                        }
-                        if v_without_tone in v_rep_map.keys():
-                            pinyin = c + v_rep_map[v_without_tone]
-                    else:
-                        # 单音节
-                        pinyin_rep_map = {
-                            "ing": "ying",
-                            "i": "yi",
-                            "in": "yin",
-                            "u": "wu",
-                        }
-                        if pinyin in pinyin_rep_map.keys():
-                            pinyin = pinyin_rep_map[pinyin]
-                        else:
-                            single_rep_map = {
-                                "v": "yu",
-                                "e": "e",
-                                "i": "y",
-                                "u": "w",
-                            }
-                            if pinyin[0] in single_rep_map.keys():
-                                pinyin = single_rep_map[pinyin[0]] + pinyin[1:]
-
-                    assert pinyin in pinyin_to_symbol_map.keys(), (pinyin, seg, raw_pinyin)
-                    phone = pinyin_to_symbol_map[pinyin].split(" ")
-                    word2ph.append(len(phone))
-
+                phone, tone = syllable_to_phones(c, v)
+                word2ph.append(len(phone))
                 phones_list += phone
-                tones_list += [int(tone)] * len(phone)
+                tones_list += [tone] * len(phone)
     return phones_list, tones_list, word2ph
 
 
+def warm_up():
+    from . import chinese, english
+
+    chinese.warm_up()
+    english.warm_up()
+    get_tokenizer()
+
+
 def text_normalize(text):
     numbers = re.findall(r"\d+(?:\.?\d+)?", text)
     for number in numbers:
@@ -198,26 +169,45 @@ def get_bert_feature(text, word2ph, device):
     from . import chinese_bert
     return chinese_bert.get_bert_feature(text, word2ph, model_id='bert-base-multilingual-uncased', device=device)
 
-from .chinese import _g2p as _chinese_g2p
-def _g2p_v2(segments):
-    spliter = '#$&^!@'
 
-    phones_list = []
-    tones_list = []
-    word2ph = []
+def get_bert_features(items, device):
+    from . import chinese_bert
+    return chinese_bert.get_bert_features(items, model_id='bert-base-multilingual-uncased', device=device)
+
+
+from .chinese import _g2p_batch as _chinese_g2p_batch
 
+
+def _split_runs(segments):
+    spliter = '#$&^!@'
+    runs = []
     for text in segments:
         assert spliter not in text
         # replace all english words
         text = re.sub('([a-zA-Z\s]+)', lambda x: f'{spliter}{x.group(1)}{spliter}', text)
-        texts = text.split(spliter)
-        texts = [t for t in texts if len(t) > 0]
+        runs += [t for t in text.split(spliter) if len(t) > 0]
+    return runs
+
+
+def _is_english(run):
+    return re.match(r'[a-zA-Z\s]+', run) is not None
+
 
-        
-        for text in texts:
-            if re.match('[a-zA-Z\s]+', text):
+def _g2p_v2_batch(segment_lists):
+    """`_g2p_v2` for several documents, with the Chinese runs of all of them cut in one jieba pass."""
+    run_lists = [_split_runs(segments) for segments in segment_lists]
+    zh_runs = [[run] for runs in run_lists for run in runs if not _is_english(run)]
+    zh_results = iter(_chinese_g2p_batch(zh_runs))
+
+    results = []
+    for runs in run_lists:
+        phones_list = []
+        tones_list = []
+        word2ph = []
+        for text in runs:
+            if _is_english(text):
                 # english
-                tokenized_en = tokenizer.tokenize(text)
+                tokenized_en = get_tokenizer().tokenize(text)
                 phones_en, tones_en, word2ph_en = g2p_en(text=None, pad_start_end=False, tokenized=tokenized_en)
                 # apply offset to tones_en
                 tones_en = [t + language_tone_start_map['EN'] for t in tones_en]
@@ -225,11 +215,16 @@ def _g2p_v2(segments):
                 tones_list += tones_en
                 word2ph += word2ph_en
             else:
-                phones_zh, tones_zh, word2ph_zh = _chinese_g2p([text])
+                phones_zh, tones_zh, word2ph_zh = next(zh_results)
                 phones_list += phones_zh
                 tones_list += tones_zh
                 word2ph += word2ph_zh
-    return phones_list, tones_list, word2ph
+        results.append((phones_list, tones_list, word2ph))
+    return results
+
+
+def _g2p_v2(segments):
+    return _g2p_v2_batch([segments])[0]
 
     
 
@@ -1,10 +1,49 @@
-from . import chinese, japanese, english, chinese_mix, korean, french, spanish
 from . import cleaned_text_to_sequence
+import gc
 import copy
+import importlib
+from collections.abc import Mapping
 from melo.ssml import extract_text_from_ssml
 
-language_module_map = {"ZH": chinese, "JP": japanese, "EN": english, 'ZH_MIX_EN': chinese_mix, 'KR': korean,
-                    'FR': french, 'SP': spanish, 'ES': spanish}
+
+class LazyModuleMap(Mapping):
+    """Maps a language to its frontend module, importing the module on first lookup."""
+
+    def __init__(self, module_names):
+        self.module_names = module_names
+
+    def __getitem__(self, language):
+        return importlib.import_module(f"{__package__}.{self.module_names[language]}")
+
+    def __iter__(self):
+        return iter(self.module_names)
+
+    def __len__(self):
+        return len(self.module_names)
+
+
+language_module_map = LazyModuleMap({"ZH": "chinese", "JP": "japanese", "EN": "english", 'ZH_MIX_EN': "chinese_mix", 'KR': "korean",
+                    'FR': "french", 'SP': "spanish", 'ES': "spanish"})
+
+
+def warm_up(languages=None, freeze=False):
+    """Load the frontend dictionaries, taggers and tokenizers of `languages` (default: all).
+
+    Call this in the parent process of a pre-fork server: workers then share the
+    loaded data copy-on-write instead of each loading a private copy. With `freeze=True`,
+    everything allocated so far, by the caller too, is moved out of the garbage
+    collector's reach (`gc.freeze`), so collections in the workers do not touch, and
+    copy, those pages; it is never collected afterwards, so only pass it right before
+    forking.
+    """
+    modules = {}
+    for language in languages or language_module_map:
+        module = language_module_map[language]
+        modules[module.__name__] = module
+    for module in modules.values():
+        module.warm_up()
+    if freeze:
+        gc.freeze()
 
 
 def clean_text(text, language):
@@ -16,6 +55,16 @@ def clean_text(text, language):
     return norm_text, phones, tones, word2ph
 
 
+def clean_texts(texts, language):
+    """`clean_text` for several texts, through the frontend's `g2p_batch` when it has one."""
+    texts = [extract_text_from_ssml(text) if text.startswith("<speak>") else text for text in texts]
+    language_module = language_module_map[language]
+    if not hasattr(language_module, "g2p_batch"):
+        return [clean_text(text, language) for text in texts]
+    norm_texts = [language_module.text_normalize(text) for text in texts]
+    return [(norm_text, *g2p) for norm_text, g2p in zip(norm_texts, language_module.g2p_batch(norm_texts))]
+
+
 def clean_text_bert(text, language, device=None):
     language_module = language_module_map[language]
     norm_text = language_module.text_normalize(text)
@@ -1,21 +1,31 @@
-import pickle
 import os
 import re
-from g2p_en import G2p
 
 from . import symbols
+from .cache import LRUCache
 
 from .english_utils.abbreviations import expand_abbreviations
 from .english_utils.time_norm import expand_time_english
 from .english_utils.number_norm import normalize_numbers
-from .japanese import distribute_phone
+from .english_utils.oov import OOVLexicon, predict_batch
+from .english_utils.cmudict_index import CMUDictIndex, build_index
 
-from transformers import AutoTokenizer
+from .bert_utils import distribute_phone, lazy_tokenizer
 
 current_file_path = os.path.dirname(__file__)
 CMU_DICT_PATH = os.path.join(current_file_path, "cmudict.rep")
-CACHE_PATH = os.path.join(current_file_path, "cmudict_cache.pickle")
-_g2p = G2p()
+INDEX_PATH = os.environ.get("MELO_CMUDICT_INDEX", os.path.join(current_file_path, "cmudict_index"))
+OOV_LEXICON_PATH = os.environ.get("MELO_EN_OOV_LEXICON")
+WORD_CACHE_SIZE = int(os.environ.get("MELO_EN_WORD_CACHE_SIZE", 100000))
+_g2p = None
+
+
+def get_g2p():
+    global _g2p
+    if _g2p is None:
+        from g2p_en import G2p
+        _g2p = G2p()
+    return _g2p
 
 arpa = {
     "AH0",
@@ -139,23 +149,86 @@ def read_dict():
     return g2p_dict
 
 
-def cache_dict(g2p_dict, file_path):
-    with open(file_path, "wb") as pickle_file:
-        pickle.dump(g2p_dict, pickle_file)
+def get_dict():
+    if not CMUDictIndex.exists(INDEX_PATH):
+        build_index(read_dict(), INDEX_PATH)
+    return CMUDictIndex(INDEX_PATH)
+
 
+eng_dict = None
 
-def get_dict():
-    if os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "rb") as pickle_file:
-            g2p_dict = pickle.load(pickle_file)
-    else:
-        g2p_dict = read_dict()
-        cache_dict(g2p_dict, CACHE_PATH)
 
-    return g2p_dict
+def get_eng_dict():
+    global eng_dict
+    if eng_dict is None:
+        eng_dict = get_dict()
+    return eng_dict
+
+
+oov_lexicon = None
+
+
+def get_oov_lexicon():
+    global oov_lexicon
+    if oov_lexicon is None:
+        oov_lexicon = OOVLexicon(OOV_LEXICON_PATH)
+    return oov_lexicon
+
+
+_word_cache = LRUCache(WORD_CACHE_SIZE)
 
 
-eng_dict = get_dict()
+def g2p_oov(words):
+    """Raw g2p_en phones for words missing from `eng_dict`, as {word: phones}.
+
+    Known entries come from the OOV lexicon. Plain lowercase words that g2p_en would
+    send to its neural model are predicted together in one batch; anything else (digits,
+    punctuation, homographs, words in g2p_en's own dictionary) goes through the full
+    `G2p` call one word at a time. New pronunciations are added to the lexicon.
+    """
+    lexicon = get_oov_lexicon()
+    prons = {w: lexicon[w] for w in words if w in lexicon}
+    unknown = [w for w in dict.fromkeys(words) if w not in prons]
+    if not unknown:
+        return prons
+    g2p = get_g2p()
+    new = {}
+    predictable = []
+    for w in unknown:
+        if re.fullmatch(r"[a-z]+", w) and w not in g2p.cmu and w not in g2p.homograph2features:
+            predictable.append(w)
+        else:
+            new[w] = [p for p in g2p(w) if p != " "]
+    new.update(zip(predictable, predict_batch(g2p, predictable)))
+    lexicon.update(new)
+    prons.update(new)
+    return prons
+
+
+def words_to_phonemes(words):
+    """(phones, tones) for each word, from `eng_dict` or g2p_en, through a shared LRU cache."""
+    return _word_cache.get_many(words, _words_to_phonemes)
+
+
+def _words_to_phonemes(words):
+    eng_dict = get_eng_dict()
+    oov = g2p_oov([w for w in words if w.upper() not in eng_dict])
+    results = []
+    for w in words:
+        if w.upper() in eng_dict:
+            phns, tns = refine_syllables(eng_dict[w.upper()])
+        else:
+            phns, tns = [], []
+            for ph in oov[w]:
+                if ph in arpa:
+                    ph, tn = refine_ph(ph)
+                    phns.append(ph)
+                    tns.append(tn)
+                else:
+                    phns.append(ph)
+                    tns.append(0)
+        results.append((tuple(phns), tuple(tns)))
+    return results
 
 
 def refine_ph(phn):
@@ -186,9 +259,19 @@ def text_normalize(text):
     return text
 
 model_id = 'bert-base-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+get_tokenizer = lazy_tokenizer(model_id)
+
+
+def warm_up():
+    get_eng_dict()
+    get_oov_lexicon()
+    get_g2p()
+    get_tokenizer()
+
+
 def g2p_old(text):
-    tokenized = tokenizer.tokenize(text)
+    tokenized = get_tokenizer().tokenize(text)
+    eng_dict = get_eng_dict()
     # import pdb; pdb.set_trace()
     phones = []
     tones = []
@@ -199,7 +282,7 @@ def g2p_old(text):
             phones += phns
             tones += tns
         else:
-            phone_list = list(filter(lambda p: p != " ", _g2p(w)))
+            phone_list = list(filter(lambda p: p != " ", get_g2p()(w)))
             for ph in phone_list:
                 if ph in arpa:
                     ph, tn = refine_ph(ph)
@@ -216,7 +299,7 @@ def g2p_old(text):
 
 def g2p(text, pad_start_end=True, tokenized=None):
     if tokenized is None:
-        tokenized = tokenizer.tokenize(text)
+        tokenized = get_tokenizer().tokenize(text)
     # import pdb; pdb.set_trace()
     phs = []
     ph_groups = []
@@ -229,27 +312,11 @@ def g2p(text, pad_start_end=True, tokenized=None):
     phones = []
     tones = []
     word2ph = []
-    for group in ph_groups:
-        w = "".join(group)
-        phone_len = 0
-        word_len = len(group)
-        if w.upper() in eng_dict:
-            phns, tns = refine_syllables(eng_dict[w.upper()])
-            phones += phns
-            tones += tns
-            phone_len += len(phns)
-        else:
-            phone_list = list(filter(lambda p: p != " ", _g2p(w)))
-            for ph in phone_list:
-                if ph in arpa:
-                    ph, tn = refine_ph(ph)
-                    phones.append(ph)
-                    tones.append(tn)
-                else:
-                    phones.append(ph)
-                    tones.append(0)
-                phone_len += 1
-        aaa = distribute_phone(phone_len, word_len)
+    prons = words_to_phonemes(["".join(group) for group in ph_groups])
+    for group, (phns, tns) in zip(ph_groups, prons):
+        phones += phns
+        tones += tns
+        aaa = distribute_phone(len(phns), len(group))
         word2ph += aaa
     phones = [post_replace_ph(i) for i in phones]
 
@@ -260,10 +327,17 @@ def g2p(text, pad_start_end=True, tokenized=None):
     return phones, tones, word2ph
 
 def get_bert_feature(text, word2ph, device=None):
-    from text import english_bert
+    from . import english_bert
 
     return english_bert.get_bert_feature(text, word2ph, device=device)
 
+
+def get_bert_features(items, device=None):
+    from . import english_bert
+
+    return english_bert.get_bert_features(items, device=device)
+
+
 if __name__ == "__main__":
     # print(get_dict())
     # print(eng_word_to_phoneme("hello"))
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+_FILES = ("keys.npy", "phones.npy", "phone_offsets.npy", "symbols.txt")
+_SEP = 0  # phone id that separates syllables
+
+
+def build_index(g2p_dict, path):
+    """Write `g2p_dict` (word -> list of syllables, each a list of phones) as an index at `path`.
+
+    Words are stored utf-8 encoded and sorted in a fixed-width byte-string array,
+    pronunciations as packed phone ids (syllables separated by 0) with an offsets
+    table. The directory is written next to `path` and renamed into place, so
+    processes building it concurrently never see a partial index.
+    """
+    words = sorted(g2p_dict, key=lambda w: w.encode("utf-8"))
+    symbols = ["-"] + sorted({ph for syllables in g2p_dict.values() for syl in syllables for ph in syl})
+    symbol_to_id = {s: i for i, s in enumerate(symbols)}
+    dtype = np.uint8 if len(symbols) <= 256 else np.uint16
+
+    phones, phone_offsets = [], [0]
+    for word in words:
+        for i, syllable in enumerate(g2p_dict[word]):
+            if i:
+                phones.append(_SEP)
+            phones.extend(symbol_to_id[ph] for ph in syllable)
+        phone_offsets.append(len(phones))
+
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".cmudict_index.")
+    try:
+        np.save(os.path.join(tmp, "keys.npy"), np.array([w.encode("utf-8") for w in words], dtype=np.bytes_))
+        np.save(os.path.join(tmp, "phones.npy"), np.array(phones, dtype=dtype))
+        np.save(os.path.join(tmp, "phone_offsets.npy"), np.array(phone_offsets, dtype=np.int64))
+        with open(os.path.join(tmp, "symbols.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(symbols))
+        os.replace(tmp, path)
+    except OSError:
+        # another process finished first
+        if not CMUDictIndex.exists(path):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+class CMUDictIndex(Mapping):
+    """Read-only word -> syllables mapping over an index written by `build_index`.
+
+    The arrays are memory-mapped, so opening the index is nearly free and every process
+    shares the same pages through the OS page cache. Lookups are a `searchsorted` over
+    the sorted key table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.words = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+        self.phones = np.load(os.path.join(path, "phones.npy"), mmap_mode="r")
+        self.phone_offsets = np.load(os.path.join(path, "phone_offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "symbols.txt"), encoding="utf-8") as f:
+            self.symbols = f.read().split("\n")
+
+    @staticmethod
+    def exists(path):
+        return all(os.path.exists(os.path.join(path, name)) for name in _FILES)
+
+    def _find(self, word):
+        if not isinstance(word, str):
+            return -1
+        target = word.encode("utf-8")
+        if len(target) > self.words.dtype.itemsize:
+            return -1
+        i = int(np.searchsorted(self.words, target))
+        if i < len(self.words) and self.words[i] == target:
+            return i
+        return -1
+
+    def __getitem__(self, word):
+        i = self._find(word)
+        if i < 0:
+            raise KeyError(word)
+        syllables = [[]]
+        for ph in self.phones[self.phone_offsets[i]:self.phone_offsets[i + 1]].tolist():
+            if ph == _SEP:
+                syllables.append([])
+            else:
+                syllables[-1].append(self.symbols[ph])
+        return syllables
+
+    def __contains__(self, word):
+        return self._find(word) >= 0
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.words[i].decode("utf-8")
@@ -0,0 +1,77 @@
+import os
+import threading
+
+import numpy as np
+
+
+def predict_batch(g2p, words, max_len=20):
+    """`g2p_en.G2p.predict` for many words at once.
+
+    Runs the grapheme encoder and the greedy phoneme decoder on all words as one numpy
+    batch; each word gets the same phonemes `g2p.predict(word)` would give it.
+    """
+    if not words:
+        return []
+    lengths = np.array([len(w) + 1 for w in words])
+    x = np.zeros((len(words), lengths.max()), dtype=np.int64)
+    for i, w in enumerate(words):
+        x[i, :lengths[i]] = [g2p.g2idx.get(c, g2p.g2idx["<unk>"]) for c in w] + [g2p.g2idx["</s>"]]
+    enc = np.take(g2p.enc_emb, x, axis=0)
+
+    # encoder; rows stop updating once their word has ended
+    h = np.zeros((len(words), g2p.enc_w_hh.shape[-1]), np.float32)
+    for t in range(x.shape[1]):
+        h_t = g2p.grucell(enc[:, t, :], h, g2p.enc_w_ih, g2p.enc_w_hh, g2p.enc_b_ih, g2p.enc_b_hh)
+        h = np.where((t < lengths)[:, None], h_t, h)
+
+    # decoder
+    dec = np.take(g2p.dec_emb, [2] * len(words), axis=0)  # 2: <s>
+    preds = [[] for _ in words]
+    done = np.zeros(len(words), dtype=bool)
+    for _ in range(max_len):
+        h = g2p.grucell(dec, h, g2p.dec_w_ih, g2p.dec_w_hh, g2p.dec_b_ih, g2p.dec_b_hh)
+        logits = np.matmul(h, g2p.fc_w.T) + g2p.fc_b
+        pred = logits.argmax(-1)
+        done |= pred == 3  # 3: </s>
+        if done.all():
+            break
+        for i in np.flatnonzero(~done):
+            preds[i].append(pred[i])
+        dec = np.take(g2p.dec_emb, pred, axis=0)
+    return [[g2p.idx2p.get(idx, "<unk>") for idx in p] for p in preds]
+
+
+class OOVLexicon:
+    """Pronunciations of out-of-vocabulary words, optionally persisted to a text file.
+
+    Each line of `path` is `word<TAB>phone phone ...`. The file is read once and new
+    entries are appended, so it grows across runs and processes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    word, _, phones = line.rstrip("\n").partition("\t")
+                    if word:
+                        self.entries[word] = phones.split()
+
+    def __contains__(self, word):
+        return word in self.entries
+
+    def __getitem__(self, word):
+        return self.entries[word]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, prons):
+        with self.lock:
+            new = {w: p for w, p in prons.items() if w not in self.entries}
+            self.entries.update(new)
+            if self.path is not None and new:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(f"{w}\t{' '.join(p)}\n" for w, p in new.items())
@@ -1,12 +1,37 @@
+import os
+
+from ..cache import LRUCache
+from ..fr_phonemizer.gruut_wrapper import phonemize_words_cached
 from .cleaner import spanish_cleaners
 from .gruut_wrapper import Gruut
 
+phonemizer = None
+
+
+def get_phonemizer():
+    global phonemizer
+    if phonemizer is None:
+        phonemizer = Gruut(language="es-es", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
+    return phonemizer
+
+
 def es2ipa(text):
-    e = Gruut(language="es-es", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
     # text = spanish_cleaners(text)
-    phonemes = e.phonemize(text, separator="")
+    phonemes = get_phonemizer().phonemize(text, separator="")
     return phonemes
 
 
+WORD_CACHE_SIZE = int(os.environ.get("MELO_ES_WORD_CACHE_SIZE", 50000))
+_word_cache = LRUCache(WORD_CACHE_SIZE)
+
+
+def es2ipa_words(words):
+    """`es2ipa` for a list of words, memoized in a bounded LRU.
+
+    The words that miss the cache are phonemized together in one gruut pass.
+    """
+    return phonemize_words_cached(get_phonemizer(), words, _word_cache)
+
+
 if __name__ == '__main__':
   print(es2ipa('¿Y a quién echaría de menos, en el mundo si no fuese a vos?'))
\ No newline at end of file
@@ -73,39 +73,76 @@ class Gruut(BasePhonemizer):
                 consecutive characters of a single phoneme. Else separate phoneme
                 with '_'. This option requires espeak>=1.49. Default to False.
         """
+        words = [word for sentence in gruut.sentences(text, lang=self.language, espeak=self.use_espeak_phonemes) for word in sentence]
+        return self._join_words(words, separator)
+
+    def _join_words(self, words, separator):
+        """Join the phonemes of gruut `words` the way `phonemize_gruut` returns them."""
         ph_list = []
-        for sentence in gruut.sentences(text, lang=self.language, espeak=self.use_espeak_phonemes):
-            for word in sentence:
-                if word.is_break:
-                    # Use actual character for break phoneme (e.g., comma)
-                    if ph_list:
-                        # Join with previous word
-                        ph_list[-1].append(word.text)
-                    else:
-                        # First word is punctuation
-                        ph_list.append([word.text])
-                elif word.phonemes:
-                    # Add phonemes for word
-                    word_phonemes = []
-
-                    for word_phoneme in word.phonemes:
-                        if not self.keep_stress:
-                            # Remove primary/secondary stress
-                            word_phoneme = IPA.without_stress(word_phoneme)
-
-                        word_phoneme = word_phoneme.translate(GRUUT_TRANS_TABLE)
-
-                        if word_phoneme:
-                            # Flatten phonemes
-                            word_phonemes.extend(word_phoneme)
-
-                    if word_phonemes:
-                        ph_list.append(word_phonemes)
+        for word in words:
+            if word.is_break:
+                # Use actual character for break phoneme (e.g., comma)
+                if ph_list:
+                    # Join with previous word
+                    ph_list[-1].append(word.text)
+                else:
+                    # First word is punctuation
+                    ph_list.append([word.text])
+            elif word.phonemes:
+                # Add phonemes for word
+                word_phonemes = []
+
+                for word_phoneme in word.phonemes:
+                    if not self.keep_stress:
+                        # Remove primary/secondary stress
+                        word_phoneme = IPA.without_stress(word_phoneme)
+
+                    word_phoneme = word_phoneme.translate(GRUUT_TRANS_TABLE)
+
+                    if word_phoneme:
+                        # Flatten phonemes
+                        word_phonemes.extend(word_phoneme)
+
+                if word_phonemes:
+                    ph_list.append(word_phonemes)
 
         ph_words = [separator.join(word_phonemes) for word_phonemes in ph_list]
         ph = f"{separator} ".join(ph_words)
         return ph
 
+    def phonemize_words(self, words: List[str], separator="|") -> List[str]:
+        """`phonemize` each of `words`, sending the plain ones through a single gruut pass.
+
+        The words are joined by newlines, so the trailing whitespace of gruut's output words
+        tells which input word they came from. Sentence post-processing is turned off: it only
+        adds context-dependent liaisons between neighbours, which a word phonemized on its own
+        never has. Words with punctuation, or that gruut expands into several words (numbers),
+        go through `phonemize` one by one.
+        """
+        results = [None] * len(words)
+        plain = [
+            i for i, w in enumerate(words) if w.split() == [w] and not self._punctuator.puncs_regular_exp.search(w)
+        ]
+        if plain:
+            text = "\n".join(words[i] for i in plain)
+            groups, group = [], []
+            for sentence in gruut.sentences(text, lang=self.language, espeak=self.use_espeak_phonemes, post_process=False):
+                for word in sentence:
+                    group.append(word)
+                    if "\n" in word.trailing_ws:
+                        groups.append(group)
+                        group = []
+            if group:
+                groups.append(group)
+            if len(groups) == len(plain):
+                for i, group in zip(plain, groups):
+                    if len(group) == 1 and not group[0].is_break:
+                        results[i] = self._join_words(group, separator)
+        for i, w in enumerate(words):
+            if results[i] is None:
+                results[i] = self.phonemize(w, separator)
+        return results
+
     def _phonemize(self, text, separator):
         return self.phonemize_gruut(text, separator, tie=False)
 
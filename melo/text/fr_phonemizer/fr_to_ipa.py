@@ -1,5 +1,8 @@
+import os
+
+from ..cache import LRUCache
 from .cleaner import french_cleaners
-from .gruut_wrapper import Gruut
+from .gruut_wrapper import Gruut, phonemize_words_cached
 
 
 def remove_consecutive_t(input_str):
@@ -20,11 +23,32 @@ def remove_consecutive_t(input_str):
 
     return ''.join(result)
 
+phonemizer = None
+
+
+def get_phonemizer():
+    global phonemizer
+    if phonemizer is None:
+        phonemizer = Gruut(language="fr-fr", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
+    return phonemizer
+
+
 def fr2ipa(text):
-    e = Gruut(language="fr-fr", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
     # text = french_cleaners(text)
-    phonemes = e.phonemize(text, separator="")
+    phonemes = get_phonemizer().phonemize(text, separator="")
     # print(phonemes)
     phonemes = remove_consecutive_t(phonemes)
     # print(phonemes)
-    return phonemes
\ No newline at end of file
+    return phonemes
+
+
+WORD_CACHE_SIZE = int(os.environ.get("MELO_FR_WORD_CACHE_SIZE", 50000))
+_word_cache = LRUCache(WORD_CACHE_SIZE)
+
+
+def fr2ipa_words(words):
+    """`fr2ipa` for a list of words, memoized in a bounded LRU.
+
+    The words that miss the cache are phonemized together in one gruut pass.
+    """
+    return phonemize_words_cached(get_phonemizer(), words, _word_cache, remove_consecutive_t)
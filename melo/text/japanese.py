@@ -1,9 +1,11 @@
 # Convert Japanese text to phonemes which is
 # compatible with Julius https://github.com/julius-speech/segmentation-kit
+import os
 import re
+import functools
 import unicodedata
 
-from transformers import AutoTokenizer
+from .bert_utils import distribute_phone, lazy_tokenizer
 
 from . import symbols
 punctuation = ["!", "?", "…", ",", ".", "'", "-"]
@@ -322,34 +324,60 @@ _COLON_RX = re.compile(":+")
 _REJECT_RX = re.compile("[^ a-zA-Z:,.?]")
 
 
-def _makerulemap():
-    l = [tuple(x.split("/")) for x in _CONVRULES]
-    return tuple({k: v for k, v in l if len(k) == i} for i in (1, 2))
+class KanaTrie:
+    """Longest-match converter compiled from rules of the form "カナ/ p h o n e s".
+
+    Keys may have any length; `convert` walks the trie once per output unit, so the
+    whole pass is linear in the length of the text.
+    """
+
+    def __init__(self, rules):
+        self.root = {}
+        for rule in rules:
+            kana, phonemes = rule.split("/")
+            node = self.root
+            for ch in kana:
+                node = node.setdefault(ch, {})
+            node[None] = phonemes.split(" ")[1:]
+
+    def convert(self, text, start=0, end=None):
+        """Phonemes for `text[start:end]`; characters without a rule are passed through."""
+        end = len(text) if end is None else end
+        res = []
+        i = start
+        while i < end:
+            node, j = self.root, i
+            match, match_end = None, i + 1
+            while j < end and text[j] in node:
+                node = node[text[j]]
+                j += 1
+                if None in node:
+                    match, match_end = node[None], j
+            if match is None:
+                res.append(text[i])
+            else:
+                res += match
+            i = match_end
+        return res
 
 
-_RULEMAP1, _RULEMAP2 = _makerulemap()
+_KANA_TRIE = KanaTrie(_CONVRULES)
 
 
 def kata2phoneme(text: str) -> str:
     """Convert katakana text to phonemes."""
-    text = text.strip()
-    res = []
-    while text:
-        if len(text) >= 2:
-            x = _RULEMAP2.get(text[:2])
-            if x is not None:
-                text = text[2:]
-                res += x.split(" ")[1:]
-                continue
-        x = _RULEMAP1.get(text[0])
-        if x is not None:
-            text = text[1:]
-            res += x.split(" ")[1:]
-            continue
-        res.append(text[0])
-        text = text[1:]
-    # res = _COLON_RX.sub(":", res)
-    return res
+    return _KANA_TRIE.convert(text.strip())
+
+
+def kata2phoneme_words(words):
+    """`kata2phoneme` for each word; words are memoized by their reading, so the
+    converter runs once for each distinct word."""
+    return [list(_word_phonemes(w.strip())) for w in words]
+
+
+@functools.lru_cache(maxsize=int(os.environ.get("MELO_JP_KATA_CACHE_SIZE", 50000)))
+def _word_phonemes(word):
+    return tuple(_KANA_TRIE.convert(word))
 
 
 _KATAKANA = "".join(chr(ch) for ch in range(ord("ァ"), ord("ン") + 1))
@@ -364,11 +392,18 @@ def hira2kata(text: str) -> str:
 
 _SYMBOL_TOKENS = set(list("・、。？！"))
 _NO_YOMI_TOKENS = set(list("「」『』―（）［］[]"))
-_TAGGER = MeCab.Tagger()
+_TAGGER = None
+
+
+def get_tagger():
+    global _TAGGER
+    if _TAGGER is None:
+        _TAGGER = MeCab.Tagger()
+    return _TAGGER
 
 
 def text2kata(text: str) -> str:
-    parsed = _TAGGER.parse(text)
+    parsed = get_tagger().parse(text)
     res = []
     for line in parsed.split("\n"):
         if line == "EOS":
@@ -536,41 +571,51 @@ def replace_punctuation(text):
 
     return replaced_text
 
-from pykakasi import kakasi
-# Initialize kakasi object
-kakasi = kakasi()
-# Set options for converting Chinese characters to Katakana
-kakasi.setMode("J", "K")  # Chinese to Katakana
-kakasi.setMode("H", "K")  # Hiragana to Katakana
-# Convert Chinese characters to Katakana
-conv = kakasi.getConverter()
+conv = None
+
+
+def get_kakasi_converter():
+    global conv
+    if conv is None:
+        from pykakasi import kakasi
+        # Initialize kakasi object
+        kks = kakasi()
+        # Set options for converting Chinese characters to Katakana
+        kks.setMode("J", "K")  # Chinese to Katakana
+        kks.setMode("H", "K")  # Hiragana to Katakana
+        # Convert Chinese characters to Katakana
+        conv = kks.getConverter()
+    return conv
 
 def text_normalize(text):
     res = unicodedata.normalize("NFKC", text)
     res = japanese_convert_numbers_to_words(res)
     res = "".join([i for i in res if is_japanese_character(i)])
     res = replace_punctuation(res)
-    res = conv.do(res)
+    res = _kakasi_kata(res)
     return res
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
+@functools.lru_cache(maxsize=int(os.environ.get("MELO_JP_KATA_CACHE_SIZE", 50000)))
+def _kakasi_kata(text):
+    return get_kakasi_converter().do(text)
 
 
 # tokenizer = AutoTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
 
 model_id = 'tohoku-nlp/bert-base-japanese-v3'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+get_tokenizer = lazy_tokenizer(model_id)
+
+
+def warm_up():
+    get_tagger()
+    get_kakasi_converter()
+    get_tokenizer()
+
+
 def g2p(norm_text):
 
-    tokenized = tokenizer.tokenize(norm_text)
+    tokenized = get_tokenizer().tokenize(norm_text)
     phs = []
     ph_groups = []
     for t in tokenized:
@@ -579,10 +624,9 @@ def g2p(norm_text):
         else:
             ph_groups[-1].append(t.replace("#", ""))
     word2ph = []
-    for group in ph_groups:
-        text = ""
-        for ch in group:
-            text += ch
+    texts = ["".join(group) for group in ph_groups]
+    prons = iter(kata2phoneme_words([text for text in texts if text != '[UNK]' and text not in punctuation]))
+    for group, text in zip(ph_groups, texts):
         if text == '[UNK]':
             phs += ['_']
             word2ph += [1]
@@ -593,7 +637,7 @@ def g2p(norm_text):
             continue
         # import pdb; pdb.set_trace()
         # phonemes = japanese_text_to_phonemes(text)
-        phonemes = kata2phoneme(text)
+        phonemes = next(prons)
         # phonemes = [i for i in phonemes if i in symbols]
         for i in phonemes:
             assert i in symbols, (group, norm_text, tokenized, i)
@@ -612,11 +656,17 @@ def g2p(norm_text):
     return phones, tones, word2ph
 
 def get_bert_feature(text, word2ph, device):
-    from text import japanese_bert
+    from . import japanese_bert
 
     return japanese_bert.get_bert_feature(text, word2ph, device=device)
 
 
+def get_bert_features(items, device):
+    from . import japanese_bert
+
+    return japanese_bert.get_bert_features(items, device=device)
+
+
 if __name__ == "__main__":
     # tokenizer = AutoTokenizer.from_pretrained("./bert/bert-base-japanese-v3")
     text = "こんにちは、世界！..."
@@ -1,11 +1,13 @@
 # Convert Japanese text to phonemes which is
 # compatible with Julius https://github.com/julius-speech/segmentation-kit
+import os
 import re
 import unicodedata
 
-from transformers import AutoTokenizer
+from .bert_utils import distribute_phone, lazy_tokenizer
 
 from . import punctuation, symbols
+from .cache import LRUCache
 
 
 from num2words import num2words
@@ -41,6 +43,17 @@ def normalize_english(text):
 
 
 g2p_kr = None
+
+
+def get_g2p_kr():
+    global g2p_kr  # pylint: disable=global-statement
+    if g2p_kr is None:
+        from g2pkk import G2p
+
+        g2p_kr = G2p()
+    return g2p_kr
+
+
 def korean_text_to_phonemes(text, character: str = "hangeul") -> str:
     """
 
@@ -52,24 +65,45 @@ def korean_text_to_phonemes(text, character: str = "hangeul") -> str:
         output = '하늘' (Unicode :\u1112\u1161\u1102\u1173\u11af), (ᄒ + ᅡ + ᄂ + ᅳ + ᆯ)
 
     """
-    global g2p_kr  # pylint: disable=global-statement
-    if g2p_kr is None:
-        from g2pkk import G2p
-
-        g2p_kr = G2p()
-
     if character == "english":
         from anyascii import anyascii
         text = normalize(text)
-        text = g2p_kr(text)
+        text = get_g2p_kr()(text)
         text = anyascii(text)
         return text
 
     text = normalize(text)
-    text = g2p_kr(text)
+    text = get_g2p_kr()(text)
     text = list(hangul_to_jamo(text))  # '하늘' --> ['ᄒ', 'ᅡ', 'ᄂ', 'ᅳ', 'ᆯ']
     return "".join(text)
 
+
+SENTENCE_CACHE_SIZE = int(os.environ.get("MELO_KR_SENTENCE_CACHE_SIZE", 10000))
+_sentence_cache = LRUCache(SENTENCE_CACHE_SIZE)
+
+
+def words_to_phonemes(words):
+    """`korean_text_to_phonemes` for the words (eojeols or pieces of one) of a sentence.
+
+    The words are normalized, joined with spaces and sent through g2pkk in a single call
+    (one MeCab analysis and one pass of each rule), and the output is split back on the
+    spaces. If g2pkk changes the number of words, they are redone one by one. Liaison and
+    assimilation depend on the neighbouring words, so results are memoized per sentence
+    (the whole word list) in a bounded LRU, never per word.
+    """
+    key = tuple(words)
+    prons = _sentence_cache.get(key)
+    if prons is not None:
+        return list(prons)
+    normalized = [normalize(w) for w in words]
+    out = get_g2p_kr()(" ".join(normalized)).split(" ") if words else []
+    if len(out) != len(words) or any(not (n and o) for n, o in zip(normalized, out)):
+        out = [get_g2p_kr()(n) for n in normalized]
+    prons = tuple("".join(hangul_to_jamo(o)) for o in out)
+    _sentence_cache.put(key, prons)
+    return list(prons)
+
+
 def text_normalize(text):
     # res = unicodedata.normalize("NFKC", text)
     # res = japanese_convert_numbers_to_words(res)
@@ -79,23 +113,18 @@ def text_normalize(text):
     return text
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
-
-
 # tokenizer = AutoTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
 
 model_id = 'kykim/bert-kor-base'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+get_tokenizer = lazy_tokenizer(model_id)
+
+def warm_up():
+    get_g2p_kr()
+    get_tokenizer()
+
 
 def g2p(norm_text):
-    tokenized = tokenizer.tokenize(norm_text)
+    tokenized = get_tokenizer().tokenize(norm_text)
     phs = []
     ph_groups = []
     for t in tokenized:
@@ -104,10 +133,10 @@ def g2p(norm_text):
         else:
             ph_groups[-1].append(t.replace("#", ""))
     word2ph = []
-    for group in ph_groups:
-        text = ""
-        for ch in group:
-            text += ch
+    texts = ["".join(group) for group in ph_groups]
+    words = [text for text in texts if text != '[UNK]' and text not in punctuation]
+    prons = iter(words_to_phonemes(words))
+    for group, text in zip(ph_groups, texts):
         if text == '[UNK]':
             phs += ['_']
             word2ph += [1]
@@ -119,7 +148,7 @@ def g2p(norm_text):
         # import pdb; pdb.set_trace()
         # phonemes = japanese_text_to_phonemes(text)
         # text = g2p_kr(text)
-        phonemes = korean_text_to_phonemes(text)
+        phonemes = next(prons)
         # import pdb; pdb.set_trace()
         # # phonemes = [i for i in phonemes if i in symbols]
         # for i in phonemes:
@@ -143,6 +172,11 @@ def get_bert_feature(text, word2ph, device='cuda'):
     return japanese_bert.get_bert_feature(text, word2ph, device=device, model_id=model_id)
 
 
+def get_bert_features(items, device='cuda'):
+    from . import japanese_bert
+    return japanese_bert.get_bert_features(items, device=device, model_id=model_id)
+
+
 if __name__ == "__main__":
     # tokenizer = AutoTokenizer.from_pretrained("./bert/bert-base-japanese-v3")
     from text.symbols import symbols
@@ -5,17 +5,9 @@ import re
 from . import symbols
 from .es_phonemizer import cleaner as es_cleaner
 from .es_phonemizer import es_to_ipa
-from transformers import AutoTokenizer
+from .bert_utils import distribute_phone, lazy_tokenizer
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
 def text_normalize(text):
     text = es_cleaner.spanish_cleaners(text)
     return text
@@ -63,20 +55,24 @@ def refine_syllables(syllables):
 
 # model_id = 'bert-base-uncased'
 model_id = 'dccuchile/bert-base-spanish-wwm-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+get_tokenizer = lazy_tokenizer(model_id)
 
-def g2p(text, pad_start_end=True, tokenized=None):
-    if tokenized is None:
-        tokenized = tokenizer.tokenize(text)
-    # import pdb; pdb.set_trace()
-    phs = []
+def warm_up():
+    es_to_ipa.es2ipa("hola")
+    get_tokenizer()
+
+
+def _ph_groups(tokenized):
     ph_groups = []
     for t in tokenized:
         if not t.startswith("#"):
             ph_groups.append([t])
         else:
             ph_groups[-1].append(t.replace("#", ""))
-    
+    return ph_groups
+
+
+def _groups_to_phones(ph_groups, ipa, pad_start_end):
     phones = []
     tones = []
     word2ph = []
@@ -88,7 +84,7 @@ def g2p(text, pad_start_end=True, tokenized=None):
         if w == '[UNK]':
             phone_list = ['UNK']
         else:
-            phone_list = list(filter(lambda p: p != " ", es_to_ipa.es2ipa(w)))
+            phone_list = list(filter(lambda p: p != " ", ipa[w]))
         
         for ph in phone_list:
             phones.append(ph)
@@ -105,10 +101,33 @@ def g2p(text, pad_start_end=True, tokenized=None):
         word2ph = [1] + word2ph + [1]
     return phones, tones, word2ph
 
+
+def _g2p_groups(all_groups, pad_start_end):
+    words = list(dict.fromkeys("".join(group) for ph_groups in all_groups for group in ph_groups))
+    words = [w for w in words if w != '[UNK]']
+    ipa = dict(zip(words, es_to_ipa.es2ipa_words(words)))
+    return [_groups_to_phones(ph_groups, ipa, pad_start_end) for ph_groups in all_groups]
+
+
+def g2p_batch(texts, pad_start_end=True):
+    """`g2p` for several texts; the words of all of them are phonemized in one gruut pass."""
+    return _g2p_groups([_ph_groups(get_tokenizer().tokenize(text)) for text in texts], pad_start_end)
+
+
+def g2p(text, pad_start_end=True, tokenized=None):
+    if tokenized is None:
+        tokenized = get_tokenizer().tokenize(text)
+    return _g2p_groups([_ph_groups(tokenized)], pad_start_end)[0]
+
 def get_bert_feature(text, word2ph, device=None):
-    from text import spanish_bert
+    from . import spanish_bert
     return spanish_bert.get_bert_feature(text, word2ph, device=device)
 
+
+def get_bert_features(items, device=None):
+    from . import spanish_bert
+    return spanish_bert.get_bert_features(items, device=device)
+
 if __name__ == "__main__":
     text = "en nuestros tiempos estos dos pueblos ilustres empiezan a curarse, gracias sólo a la sana y vigorosa higiene de 1789."
     # print(text)
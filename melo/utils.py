@@ -7,13 +7,13 @@ import json
 import subprocess
 import numpy as np
 from melo.text import _clean_text
+from melo.text.cleaner import clean_texts as clean_texts_for_language
 from scipy.io.wavfile import read
 import torch
 import torchaudio
 import librosa
-from melo.text import cleaned_text_to_sequence, get_bert
+from melo.text import cleaned_text_to_sequence, get_bert_batch
 from melo import commons
-from melo.ssml import extract_text_from_ssml
 
 MATPLOTLIB_FLAG = False
 
@@ -55,44 +55,54 @@ def clean_text(text):
     return _clean_text(text, ["english_cleaners2"])
 
 def get_text_for_tts_infer(text, language_str, hps, device, symbol_to_id=None):
-    if text.startswith("<speak>"):
-        text = extract_text_from_ssml(text)
-    norm_text, phone, tone, word2ph = clean_text(text, language_str)
-    phone, tone, language = cleaned_text_to_sequence(phone, tone, language_str, symbol_to_id)
-
-    if hps.data.add_blank:
-        phone = commons.intersperse(phone, 0)
-        tone = commons.intersperse(tone, 0)
-        language = commons.intersperse(language, 0)
-        for i in range(len(word2ph)):
-            word2ph[i] = word2ph[i] * 2
-        word2ph[0] += 1
-
-    if getattr(hps.data, "disable_bert", False):
-        bert = torch.zeros(1024, len(phone))
-        ja_bert = torch.zeros(768, len(phone))
-    else:
-        bert = get_bert(norm_text, word2ph, language_str, device)
-        del word2ph
-        assert bert.shape[-1] == len(phone), phone
-
-        if language_str == "ZH":
-            bert = bert
-            ja_bert = torch.zeros(768, len(phone))
-        elif language_str in ["JP", "EN", "ZH_MIX_EN", 'KR', 'SP', 'ES', 'FR', 'DE', 'RU']:
-            ja_bert = bert
+    return get_texts_for_tts_infer([text], language_str, hps, device, symbol_to_id)[0]
+
+def get_texts_for_tts_infer(texts, language_str, hps, device, symbol_to_id=None):
+    """`get_text_for_tts_infer` for several texts; their BERT features come from one batched forward pass."""
+    cleaned = []
+    for norm_text, phone, tone, word2ph in clean_texts_for_language(texts, language_str):
+        phone, tone, language = cleaned_text_to_sequence(phone, tone, language_str, symbol_to_id)
+
+        if hps.data.add_blank:
+            phone = commons.intersperse(phone, 0)
+            tone = commons.intersperse(tone, 0)
+            language = commons.intersperse(language, 0)
+            for i in range(len(word2ph)):
+                word2ph[i] = word2ph[i] * 2
+            word2ph[0] += 1
+        cleaned.append((norm_text, phone, tone, language, word2ph))
+
+    disable_bert = getattr(hps.data, "disable_bert", False)
+    if not disable_bert:
+        berts = get_bert_batch([(norm_text, word2ph) for norm_text, _, _, _, word2ph in cleaned], language_str, device)
+
+    results = []
+    for i, (norm_text, phone, tone, language, word2ph) in enumerate(cleaned):
+        if disable_bert:
             bert = torch.zeros(1024, len(phone))
+            ja_bert = torch.zeros(768, len(phone))
         else:
-            raise NotImplementedError()
+            bert = berts[i]
+            assert bert.shape[-1] == len(phone), phone
+
+            if language_str == "ZH":
+                bert = bert
+                ja_bert = torch.zeros(768, len(phone))
+            elif language_str in ["JP", "EN", "ZH_MIX_EN", 'KR', 'SP', 'ES', 'FR', 'DE', 'RU']:
+                ja_bert = bert
+                bert = torch.zeros(1024, len(phone))
+            else:
+                raise NotImplementedError()
 
-    assert bert.shape[-1] == len(
-        phone
-    ), f"Bert seq len {bert.shape[-1]} != {len(phone)}"
+        assert bert.shape[-1] == len(
+            phone
+        ), f"Bert seq len {bert.shape[-1]} != {len(phone)}"
 
-    phone = torch.LongTensor(phone)
-    tone = torch.LongTensor(tone)
-    language = torch.LongTensor(language)
-    return bert, ja_bert, phone, tone, language
+        phone = torch.LongTensor(phone)
+        tone = torch.LongTensor(tone)
+        language = torch.LongTensor(language)
+        results.append((bert, ja_bert, phone, tone, language))
+    return results
 
 def load_checkpoint(checkpoint_path, model, optimizer=None, skip_optimizer=False):
     assert os.path.isfile(checkpoint_path)
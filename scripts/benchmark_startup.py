@@ -0,0 +1,79 @@
+"""Measure frontend startup cost per language, each in a fresh interpreter.
+
+    python scripts/benchmark_startup.py EN ZH
+    python scripts/benchmark_startup.py --warm-up ZH JP
+
+For every language this reports the time to import `melo.text.cleaner`, to import the
+language module through `language_module_map`, the first `clean_text` call (which now
+pays for the deferred tokenizer / dictionary / g2p loading) and a second, warm call.
+With --warm-up, `cleaner.warm_up` runs before the first call, as it would in the parent
+of a pre-fork server, and its time is reported separately.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+SAMPLE_TEXTS = {
+    'EN': 'The field of text-to-speech has seen rapid development recently.',
+    'ES': 'El campo de la conversión de texto a voz ha experimentado un rápido desarrollo recientemente.',
+    'SP': 'El campo de la conversión de texto a voz ha experimentado un rápido desarrollo recientemente.',
+    'FR': 'Le domaine de la synthèse vocale a connu un développement rapide récemment',
+    'ZH': '语音合成领域近年来发展迅速',
+    'ZH_MIX_EN': 'text-to-speech 领域近年来发展迅速',
+    'JP': 'テキスト読み上げの分野は最近急速な発展を遂げています',
+    'KR': '최근 텍스트 음성 변환 분야가 급속도로 발전하고 있습니다.',
+}
+
+_PROBE = '''
+import json, sys, time
+language, text, warm = sys.argv[1], sys.argv[2], sys.argv[3] == '1'
+times = {}
+t = time.perf_counter()
+from melo.text.cleaner import language_module_map, clean_text, warm_up
+times['import_cleaner'] = time.perf_counter() - t
+t = time.perf_counter()
+language_module_map[language]
+times['import_language'] = time.perf_counter() - t
+if warm:
+    t = time.perf_counter()
+    warm_up([language])
+    times['warm_up'] = time.perf_counter() - t
+t = time.perf_counter()
+clean_text(text, language)
+times['first_call'] = time.perf_counter() - t
+t = time.perf_counter()
+clean_text(text, language)
+times['warm_call'] = time.perf_counter() - t
+print(json.dumps(times))
+'''
+
+
+def probe(language, warm_up=False):
+    out = subprocess.run(
+        [sys.executable, '-c', _PROBE, language, SAMPLE_TEXTS[language], '1' if warm_up else '0'],
+        capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        return None, out.stderr.strip().splitlines()[-1]
+    return json.loads(out.stdout.strip().splitlines()[-1]), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('languages', nargs='*', default=['EN', 'ES', 'FR', 'ZH', 'JP', 'KR'])
+    parser.add_argument('--warm-up', action='store_true', help='call cleaner.warm_up before the first call')
+    args = parser.parse_args()
+
+    columns = ['import_cleaner', 'import_language'] + (['warm_up'] if args.warm_up else []) + ['first_call', 'warm_call']
+    print(f"{'lang':<10}" + ''.join(f'{c:>17}' for c in columns))
+    for language in args.languages:
+        times, error = probe(language, args.warm_up)
+        if times is None:
+            print(f'{language:<10} failed: {error}')
+            continue
+        print(f'{language:<10}' + ''.join(f'{times[c]:>16.3f}s' for c in columns))
+
+
+if __name__ == '__main__':
+    main()
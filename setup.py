@@ -32,8 +32,8 @@ setup(
     },
     entry_points={
         "console_scripts": [
-            "melotts = melo.main:main",
-            "melo = melo.main:main",
+            "melotts = melo.main:cli",
+            "melo = melo.main:cli",
             "melo-ui = melo.app:main",
         ],
     },
@@ -0,0 +1,35 @@
+"""Tiny models and fake frontend outputs shared by the tests."""
+import torch
+import torch.nn as nn
+from melo.api import TTS
+from melo.models import SynthesizerTrn
+from melo.text import symbols, num_languages, num_tones
+from melo.utils import HParams
+
+
+def build_synthesizer(use_transformer_flow=True):
+    torch.manual_seed(0)
+    return SynthesizerTrn(
+        len(symbols), 513, 32,
+        inter_channels=16, hidden_channels=16, filter_channels=32,
+        n_heads=2, n_layers=3, kernel_size=3, p_dropout=0.1, resblock="1",
+        resblock_kernel_sizes=[3, 7], resblock_dilation_sizes=[[1, 3, 5], [1, 3, 5]],
+        upsample_rates=[4, 4, 2, 2], upsample_initial_channel=32, upsample_kernel_sizes=[8, 8, 4, 4],
+        n_speakers=4, gin_channels=8, num_languages=num_languages, num_tones=num_tones,
+        use_transformer_flow=use_transformer_flow,
+    ).eval()
+
+
+def build_tiny_tts():
+    tts = TTS.__new__(TTS)
+    nn.Module.__init__(tts)
+    tts.model = build_synthesizer(use_transformer_flow=False)
+    tts.device = 'cpu'
+    tts.language = 'EN'
+    tts.hps = HParams(data={'sampling_rate': 44100})
+    return tts
+
+
+def fake_inputs(n):
+    phones = torch.randint(1, len(symbols), (n,))
+    return torch.zeros(1024, n), torch.randn(768, n), phones, torch.zeros(n, dtype=torch.long), torch.zeros(n, dtype=torch.long)
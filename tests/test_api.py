@@ -0,0 +1,211 @@
+import time
+import asyncio
+import unittest
+import threading
+import numpy as np
+import torch
+from melo.api import TTS
+from melo.split_utils import split_sentence
+from helpers import build_tiny_tts, fake_inputs
+
+
+class TestBatchedInfer(unittest.TestCase):
+    def setUp(self):
+        self.tts = build_tiny_tts()
+
+    def test_batch_trims_to_single_lengths(self):
+        inputs = [fake_inputs(n) for n in (7, 15, 11)]
+        kwargs = dict(sdp_ratio=0., noise_scale=0., noise_scale_w=0.)
+        batched = self.tts._infer_batch(inputs, [0, 1, 2], **kwargs)
+        for i, item in enumerate(inputs):
+            single = self.tts._infer_batch([item], [i], **kwargs)[0]
+            self.assertEqual(batched[i].shape, single.shape)
+            self.assertEqual(batched[i].dtype, np.float32)
+            # padding must not leak into the end of the shorter items
+            self.assertTrue(np.allclose(batched[i], single, atol=1e-5))
+
+    def test_break_silence_in_batch(self):
+        inputs = [fake_inputs(n) for n in (7, 11)]
+        kwargs = dict(sdp_ratio=0., noise_scale=0., noise_scale_w=0.)
+        plain = self.tts._infer_batch(inputs, [0, 1], **kwargs)
+        audios = self.tts._infer_batch(inputs, [0, 1], ssml_attributes={'break': [{'time': '100ms'}]}, **kwargs)
+        for audio, ref in zip(audios, plain):
+            self.assertEqual(audio.size, ref.size + int(0.1 * self.tts.model.sampling_rate))
+
+
+class TestAudioConcat(unittest.TestCase):
+    def setUp(self):
+        self.segments = [np.ones(5, dtype=np.float32), np.full((1, 3), 2., dtype=np.float64)]
+
+    def reference_concat(self, sr, speed=1.):
+        audio = []
+        for segment in self.segments:
+            audio += segment.reshape(-1).tolist()
+            audio += [0] * int((sr * 0.05) / speed)
+        return np.array(audio).astype(np.float32)
+
+    def test_matches_list_concat(self):
+        audio, offsets = TTS.audio_numpy_concat(self.segments, sr=100, speed=0.5, return_offsets=True)
+        self.assertEqual(audio.dtype, np.float32)
+        np.testing.assert_array_equal(audio, self.reference_concat(100, 0.5))
+        self.assertEqual(offsets, [(0, 5), (15, 18)])
+
+    def test_writes_into_caller_buffer(self):
+        buffer = bytearray(b'\xff' * 4 * 40)
+        audio = TTS.audio_numpy_concat(self.segments, sr=100, out=memoryview(buffer))
+        np.testing.assert_array_equal(audio, self.reference_concat(100))
+        np.testing.assert_array_equal(np.frombuffer(buffer, dtype=np.float32)[:audio.size], audio)
+
+    def test_rejects_small_buffer(self):
+        with self.assertRaises(ValueError):
+            TTS.audio_numpy_concat(self.segments, sr=100, out=np.zeros(4, dtype=np.float32))
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tts = build_tiny_tts()
+        self.tts.split_sentences_into_pieces = lambda text, language, quiet=False: text.split('|')
+        self.tts._get_infer_inputs_batch = lambda texts: [fake_inputs(len(text)) for text in texts]
+
+    def test_stream_yields_one_chunk_per_sentence(self):
+        chunks = list(self.tts.tts_stream('one|three|fifteen', 0))
+        self.assertEqual(len(chunks), 3)
+        silence = int(44100 * 0.05)
+        for chunk in chunks:
+            self.assertEqual(chunk.dtype, np.float32)
+            self.assertTrue(np.all(chunk[-silence:] == 0))
+
+    def test_stream_chunked_vocoder(self):
+        chunks = list(self.tts.tts_stream('a' * 40, 0, chunk_size=8))
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(np.all(chunks[-1] == 0))
+
+    def test_stream_int16(self):
+        chunks = list(self.tts.tts_stream('one|three', 0, dtype=np.int16))
+        self.assertTrue(all(chunk.dtype == np.int16 for chunk in chunks))
+
+
+class TestStreamInput(unittest.TestCase):
+    text = 'The first sentence is here. Then a second one follows! ' * 8 + 'And the last one?'
+
+    def setUp(self):
+        self.tts = build_tiny_tts()
+        self.frontend_calls = []
+
+        def frontend(texts):
+            self.frontend_calls += texts
+            inputs = []
+            for text in texts:
+                torch.manual_seed(len(text))
+                inputs.append(fake_inputs(len(text) // 8))
+            return inputs
+
+        self.tts._get_infer_inputs_batch = frontend
+        self.kwargs = dict(sdp_ratio=0., noise_scale=0., noise_scale_w=0.)
+
+    def fragments(self):
+        return [self.text[i:i + 3] for i in range(0, len(self.text), 3)]
+
+    def test_matches_tts_stream(self):
+        chunks = list(self.tts.tts_from_stream(iter(self.fragments()), 0, **self.kwargs))
+        self.assertEqual(self.frontend_calls, split_sentence(self.text))
+        expected = list(self.tts.tts_stream(self.text, 0, frontend_workers=0, **self.kwargs))
+        self.assertEqual([c.shape for c in chunks], [c.shape for c in expected])
+
+    def test_synthesis_starts_before_the_text_ends(self):
+        started = threading.Event()
+        original = self.tts._infer_batch
+
+        def infer_batch(*args, **kwargs):
+            started.set()
+            return original(*args, **kwargs)
+
+        self.tts._infer_batch = infer_batch
+
+        def fragments():
+            yield 'A whole sentence comes first. ' * 10 + 'And'
+            self.assertTrue(started.wait(10))
+            yield ' then the rest.'
+
+        chunks = list(self.tts.tts_from_stream(fragments(), 0, **self.kwargs))
+        self.assertEqual(len(chunks), 2)
+
+    def test_async_iterator(self):
+        async def fragments():
+            for fragment in self.fragments():
+                await asyncio.sleep(0)
+                yield fragment
+
+        async def collect():
+            return [chunk async for chunk in self.tts.tts_from_stream(fragments(), 0, dtype=np.int16, **self.kwargs)]
+
+        chunks = asyncio.run(collect())
+        self.assertEqual(len(chunks), len(split_sentence(self.text)))
+        self.assertTrue(all(chunk.dtype == np.int16 for chunk in chunks))
+
+    def test_async_cancellation(self):
+        async def fragments():
+            yield 'A whole sentence comes first. ' * 10 + 'And then'
+            await asyncio.Event().wait()
+
+        async def cancel_after_first_chunk():
+            first = asyncio.Event()
+
+            async def consume():
+                async for _ in self.tts.tts_from_stream(fragments(), 0, **self.kwargs):
+                    first.set()
+
+            task = asyncio.create_task(consume())
+            await first.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        n_threads = threading.active_count()
+        asyncio.run(cancel_after_first_chunk())
+        deadline = time.monotonic() + 5
+        while threading.active_count() > n_threads and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertLessEqual(threading.active_count(), n_threads)
+
+    def test_errors_are_raised_to_the_caller(self):
+        def fragments():
+            yield 'One sentence. '
+            raise ValueError('stream broke')
+
+        with self.assertRaises(ValueError):
+            list(self.tts.tts_from_stream(fragments(), 0))
+
+
+class TestPipelinedFrontend(unittest.TestCase):
+    def test_order_is_preserved(self):
+        tts = build_tiny_tts()
+        threads = set()
+
+        def slow_frontend(texts):
+            threads.add(threading.get_ident())
+            time.sleep(0.01 * (len(texts[0]) % 3))
+            return texts
+
+        tts._get_infer_inputs_batch = slow_frontend
+        texts = ['a' * n for n in range(1, 12)]
+        self.assertEqual(list(tts._pipelined_inputs(texts, workers=3)), texts)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(list(tts._pipelined_inputs(texts, workers=0)), texts)
+
+    def test_groups_share_one_frontend_call(self):
+        tts = build_tiny_tts()
+        groups = []
+
+        def frontend(texts):
+            groups.append(texts)
+            return texts
+
+        tts._get_infer_inputs_batch = frontend
+        texts = ['a' * n for n in range(1, 8)]
+        self.assertEqual(list(tts._pipelined_inputs(iter(texts), workers=2, group_size=3)), texts)
+        self.assertEqual([len(g) for g in groups], [3, 3, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
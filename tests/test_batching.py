@@ -0,0 +1,92 @@
+import unittest
+import threading
+from unittest import mock
+import numpy as np
+from melo.batching import BatchScheduler
+from helpers import build_tiny_tts, fake_inputs
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tts = build_tiny_tts()
+        self.tts.split_sentences_into_pieces = lambda text, language, quiet=False: text.split('|')
+        self.tts._get_infer_inputs_batch = lambda texts: [fake_inputs(len(text)) for text in texts]
+        self.batch_sizes = []
+        infer_batch = self.tts._infer_batch
+
+        def counting_infer_batch(inputs, speaker_ids, **kwargs):
+            self.batch_sizes.append(len(inputs))
+            return infer_batch(inputs, speaker_ids, **kwargs)
+        self.tts._infer_batch = counting_infer_batch
+
+    def test_concurrent_requests_share_batches(self):
+        futures = []
+        with BatchScheduler(self.tts, max_batch_size=4, max_delay=0.2) as scheduler:
+            threads = [
+                threading.Thread(target=lambda i=i: futures.append(scheduler.submit('abcdef|abcdefg', i % 4)))
+                for i in range(4)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            results = [f.result(timeout=30) for f in futures]
+        self.assertEqual(sum(self.batch_sizes), 8)
+        self.assertLess(len(self.batch_sizes), 8)
+        for audio in results:
+            self.assertEqual(audio.dtype, np.float32)
+
+    def test_different_speeds_are_not_mixed(self):
+        with BatchScheduler(self.tts, max_batch_size=8, max_delay=0.05) as scheduler:
+            a = scheduler.submit('abcdef', 0, speed=1.0)
+            b = scheduler.submit('abcdef', 0, speed=2.0)
+            a.result(timeout=30), b.result(timeout=30)
+        self.assertEqual(self.batch_sizes, [1, 1])
+
+    def test_full_bucket_is_not_blocked_by_older_one(self):
+        with BatchScheduler(self.tts, max_batch_size=2, max_delay=10, bucket_width=8) as scheduler:
+            waiting = scheduler.submit('abc', 0)
+            full = scheduler.submit('abcdefghij|abcdefghijk', 1)
+            full.result(timeout=5)
+            self.assertFalse(waiting.done())
+        self.assertEqual(waiting.result(timeout=30).dtype, np.float32)
+        self.assertEqual(self.batch_sizes, [2, 1])
+
+    def test_failure_resolving_results_keeps_worker_alive(self):
+        concat = self.tts.audio_numpy_concat
+        self.tts.audio_numpy_concat = mock.Mock(side_effect=ValueError('bad segment'))
+        with BatchScheduler(self.tts, max_delay=0.01) as scheduler:
+            with self.assertRaises(ValueError):
+                scheduler.submit('abcdef', 0).result(timeout=30)
+            self.tts.audio_numpy_concat = concat
+            self.assertEqual(scheduler.submit('abcdef', 0).result(timeout=30).dtype, np.float32)
+
+    def test_cancelled_request_does_not_fail_its_batch(self):
+        concat = self.tts.audio_numpy_concat
+        calls = []
+
+        def cancelling_concat(*args, **kwargs):
+            # the caller cancels after the scheduler checked the Future, before it is resolved
+            calls.append(None)
+            if len(calls) == 2:
+                cancelled.cancel()
+            return concat(*args, **kwargs)
+        self.tts.audio_numpy_concat = cancelling_concat
+        with BatchScheduler(self.tts, max_batch_size=3, max_delay=10) as scheduler:
+            first = scheduler.submit('abcdef', 0)
+            cancelled = scheduler.submit('abcdeg', 1)
+            last = scheduler.submit('abcdeh', 2)
+            self.assertEqual(first.result(timeout=30).dtype, np.float32)
+            self.assertEqual(last.result(timeout=30).dtype, np.float32)
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(self.batch_sizes, [3])
+
+    def test_closed_scheduler_rejects_requests(self):
+        scheduler = BatchScheduler(self.tts)
+        scheduler.close()
+        with self.assertRaises(RuntimeError):
+            scheduler.submit('abc', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
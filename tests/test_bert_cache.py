@@ -0,0 +1,103 @@
+import os
+import unittest
+import tempfile
+from unittest import mock
+
+import torch
+from melo.text import bert_utils
+from melo.text.bert_cache import BertFeatureCache
+
+
+class CountingExtractor:
+    calls = 0
+
+    def __init__(self, model_id, device, layer=-3):
+        pass
+
+    def __call__(self, text):
+        CountingExtractor.calls += 1
+        return torch.arange(len(text) * 4, dtype=torch.float32).view(len(text), 4)
+
+    def batch(self, texts):
+        CountingExtractor.calls += 1
+        return [torch.arange(len(text) * 4, dtype=torch.float32).view(len(text), 4) for text in texts]
+
+
+class TestBertFeatureCache(unittest.TestCase):
+    def test_memory_lru_evicts_by_bytes(self):
+        feature = torch.zeros(4, 16)  # 256 bytes
+        cache = BertFeatureCache(max_bytes=600)
+        cache.put('m', 'a', [1], feature)
+        cache.put('m', 'b', [1], feature)
+        self.assertIsNotNone(cache.get('m', 'a', [1]))
+        cache.put('m', 'c', [1], feature)
+        self.assertIsNone(cache.get('m', 'b', [1]))
+        self.assertIsNotNone(cache.get('m', 'a', [1]))
+        self.assertIsNotNone(cache.get('m', 'c', [1]))
+        self.assertEqual(cache.stats(), {'hits': 3, 'disk_hits': 0, 'misses': 1, 'entries': 2, 'bytes': 512})
+
+    def test_key_includes_model_and_word2ph(self):
+        cache = BertFeatureCache()
+        cache.put('m', 'a', [1, 2], torch.ones(4, 3))
+        self.assertIsNone(cache.get('other', 'a', [1, 2]))
+        self.assertIsNone(cache.get('m', 'a', [2, 1]))
+
+    def test_disk_round_trip(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            feature = torch.randn(8, 5)
+            BertFeatureCache(cache_dir=cache_dir).put('m', 'a', [5], feature)
+            cache = BertFeatureCache(cache_dir=cache_dir)
+            loaded = cache.get('m', 'a', [5])
+            self.assertTrue(torch.equal(loaded, feature))
+            self.assertEqual(cache.get('m', 'a', [5]).data_ptr(), loaded.data_ptr())
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+            self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_disk_trimmed_oldest_first(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = BertFeatureCache(cache_dir=cache_dir, max_disk_bytes=2000)
+            for i in range(4):
+                cache.put('m', str(i), [1], torch.zeros(4, 64))  # 1024 bytes + header
+                path = os.path.join(cache_dir, cache.make_key('m', str(i), [1]) + '.npy')
+                os.utime(path, (i, i))
+            self.assertLessEqual(cache.disk_bytes, 2000)
+            names = set(os.listdir(cache_dir))
+            self.assertEqual(names, {cache.make_key('m', '3', [1]) + '.npy'})
+
+
+class TestPhoneLevelFeature(unittest.TestCase):
+    def setUp(self):
+        CountingExtractor.calls = 0
+        patcher = mock.patch.multiple(
+            bert_utils, BertFeatureExtractor=CountingExtractor, _extractors={}, bert_cache=BertFeatureCache(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_sentence_skips_extractor(self):
+        first = bert_utils.get_phone_level_feature('m', 'abc', [1, 2, 0], device='cpu')
+        second = bert_utils.get_phone_level_feature('m', 'abc', [1, 2, 0], device='cpu')
+        self.assertEqual(first.shape, (4, 3))
+        self.assertTrue(torch.equal(first[:, 1], first[:, 2]))
+        self.assertIs(first, second)
+        self.assertEqual(CountingExtractor.calls, 1)
+
+    def test_batch_runs_only_misses_in_one_call(self):
+        single = bert_utils.get_phone_level_feature('m', 'ab', [2, 1], device='cpu')
+        features = bert_utils.get_phone_level_features(
+            'm', [('abc', [1, 1, 1]), ('ab', [2, 1]), ('abcd', [1, 0, 2, 1])], device='cpu',
+        )
+        self.assertEqual(CountingExtractor.calls, 2)
+        self.assertIs(features[1], single)
+        self.assertEqual([f.shape[1] for f in features], [3, 3, 4])
+        self.assertTrue(torch.equal(features[2][:, 1], features[2][:, 2]))
+
+    def test_disabled_cache(self):
+        bert_utils.configure_bert_cache(max_bytes=0)
+        bert_utils.get_phone_level_feature('m', 'abc', [1, 1, 1], device='cpu')
+        bert_utils.get_phone_level_feature('m', 'abc', [1, 1, 1], device='cpu')
+        self.assertEqual(CountingExtractor.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import unittest
+import tempfile
+import threading
+from unittest import mock
+import torch
+from melo.text import bert_utils
+
+
+class FakeExtractor:
+    created = []
+
+    def __init__(self, model_id, device, layer=-3):
+        FakeExtractor.created.append((model_id, device, layer))
+        self.model_id = model_id
+        self.device = device
+
+
+class TestGetExtractor(unittest.TestCase):
+    def setUp(self):
+        FakeExtractor.created = []
+        patcher = mock.patch.multiple(bert_utils, BertFeatureExtractor=FakeExtractor, _extractors={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_instance_per_model_and_device(self):
+        extractors = []
+        threads = [
+            threading.Thread(target=lambda: extractors.append(bert_utils.get_extractor('bert-base-uncased', 'cpu')))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(e is extractors[0] for e in extractors))
+        bert_utils.get_extractor('bert-base-uncased', 'cuda')
+        bert_utils.get_extractor('bert-base-uncased', 'cpu', layer=-1)
+        bert_utils.get_extractor('kykim/bert-kor-base', 'cpu')
+        self.assertEqual(FakeExtractor.created, [
+            ('bert-base-uncased', 'cpu', -3), ('bert-base-uncased', 'cuda', -3),
+            ('bert-base-uncased', 'cpu', -1), ('kykim/bert-kor-base', 'cpu', -3),
+        ])
+
+
+class TestFrontendHelpers(unittest.TestCase):
+    def test_lazy_tokenizer_loads_once_per_model(self):
+        from_pretrained = mock.Mock(side_effect=lambda model_id: object())
+        with mock.patch.object(bert_utils, '_tokenizers', {}), \
+                mock.patch('transformers.AutoTokenizer.from_pretrained', from_pretrained):
+            get_a, get_b = bert_utils.lazy_tokenizer('a'), bert_utils.lazy_tokenizer('b')
+            from_pretrained.assert_not_called()
+            self.assertIs(get_a(), get_a())
+            self.assertIs(get_a(), bert_utils.lazy_tokenizer('a')())
+            self.assertIsNot(get_a(), get_b())
+        self.assertEqual([c.args for c in from_pretrained.call_args_list], [('a',), ('b',)])
+
+    def test_distribute_phone(self):
+        self.assertEqual(bert_utils.distribute_phone(7, 3), [3, 2, 2])
+        self.assertEqual(bert_utils.distribute_phone(1, 3), [1, 0, 0])
+
+
+class TestExpandToPhones(unittest.TestCase):
+    def test_matches_repeat_loop(self):
+        res = torch.randn(6, 8)
+        word2ph = [3, 0, 1, 2, 5]
+        expected = torch.cat([res[i].repeat(word2ph[i], 1) for i in range(len(word2ph))], dim=0).T
+        self.assertTrue(torch.equal(bert_utils.expand_to_phones(res, word2ph), expected))
+
+    def test_writes_into_out(self):
+        res = torch.randn(3, 4)
+        out = torch.empty(4, 6)
+        returned = bert_utils.expand_to_phones(res, [1, 2, 3], out=out)
+        self.assertEqual(returned.data_ptr(), out.data_ptr())
+        self.assertTrue(torch.equal(out[:, 3:], res[2:3].T.expand(4, 3)))
+
+    def test_token_index_features(self):
+        with mock.patch.object(bert_utils, 'get_extractor', return_value=lambda text: torch.arange(6.).view(3, 2)):
+            features = bert_utils.get_bert_feature('abc', [2, 0, 5], 'cpu')
+        self.assertTrue(torch.equal(features, torch.tensor([[4., 5.], [0., 1.], [0., 0.]])))
+
+
+class TestTruncatedExtractor(unittest.TestCase):
+    def setUp(self):
+        from transformers import BertConfig, BertForMaskedLM, BertTokenizer
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.model_dir = tmp.name
+        vocab = os.path.join(self.model_dir, 'vocab.txt')
+        with open(vocab, 'w') as f:
+            f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', 'a', 'b', 'c', 'hello', 'world']))
+        BertTokenizer(vocab).save_pretrained(self.model_dir)
+        torch.manual_seed(0)
+        config = BertConfig(vocab_size=10, hidden_size=16, num_hidden_layers=4, num_attention_heads=2, intermediate_size=32)
+        self.full = BertForMaskedLM(config).eval()
+        self.full.save_pretrained(self.model_dir)
+        self.tokenizer = BertTokenizer.from_pretrained(self.model_dir)
+
+    def reference(self, text, layer):
+        with torch.no_grad():
+            res = self.full(**self.tokenizer(text, return_tensors='pt'), output_hidden_states=True)
+        return res['hidden_states'][layer][0]
+
+    def test_matches_full_model_hidden_state(self):
+        for layer in (-3, -1):
+            extractor = bert_utils.BertFeatureExtractor(self.model_dir, 'cpu', layer=layer)
+            self.assertEqual(len(extractor.model.encoder.layer), 4 + 1 + layer)
+            self.assertFalse(hasattr(extractor.model, 'cls'))
+            for text in ('a b c hello', 'world'):
+                torch.testing.assert_close(extractor(text), self.reference(text, layer))
+
+    def test_batch_matches_single(self):
+        extractor = bert_utils.BertFeatureExtractor(self.model_dir, 'cpu')
+        texts = ['a b c hello world a', 'hello']
+        for text, res in zip(texts, extractor.batch(texts)):
+            torch.testing.assert_close(res, extractor(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
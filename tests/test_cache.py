@@ -0,0 +1,46 @@
+import unittest
+import threading
+from melo.text.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(list(cache), ['a', 'c'])
+        self.assertIsNone(cache.get('b'))
+
+    def test_get_many_computes_distinct_misses_once(self):
+        cache = LRUCache(10)
+        cache.put('a', 'A')
+        calls = []
+
+        def compute(keys):
+            calls.append(keys)
+            return [k.upper() for k in keys]
+
+        self.assertEqual(cache.get_many(['b', 'a', 'c', 'b'], compute), ['B', 'A', 'C', 'B'])
+        self.assertEqual(cache.get_many(['c', 'a'], compute), ['C', 'A'])
+        self.assertEqual(calls, [['b', 'c']])
+
+    def test_concurrent_use_stays_bounded(self):
+        cache = LRUCache(16)
+
+        def work(offset):
+            for i in range(200):
+                cache.get_many([offset + i, i], lambda keys: [k * 2 for k in keys])
+
+        threads = [threading.Thread(target=work, args=(n * 1000,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(cache), 16)
+        self.assertTrue(all(cache.get(k) == k * 2 for k in cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
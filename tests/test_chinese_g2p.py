@@ -0,0 +1,122 @@
+import os
+import sys
+import marshal
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+from melo.text import chinese, chinese_mix
+
+
+SEGMENTS = ['语音合成领域近年来发展迅速.', '我们一起去看看吧!', '不知道你是不是也这么想?', '听一听,', '老虎老鼠.']
+
+
+class TestCutSegments(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(chinese, '_cut_cache', chinese.LRUCache(1000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_matches_cutting_each_segment(self):
+        expected = [[(w.word, w.flag) for w in chinese.psg.lcut(seg)] for seg in SEGMENTS]
+        self.assertEqual(chinese.cut_segments(SEGMENTS), expected)
+
+    def test_one_jieba_pass_and_cached_segments(self):
+        lcut = mock.Mock(wraps=chinese.psg.lcut)
+        with mock.patch.object(chinese.psg, 'lcut', lcut):
+            chinese.cut_segments(SEGMENTS[:3])
+            self.assertEqual(lcut.call_count, 1)
+            chinese.cut_segments(SEGMENTS[:3])
+            self.assertEqual(lcut.call_count, 1)
+            chinese.cut_segments(SEGMENTS)
+            lcut.assert_called_with('\n'.join(SEGMENTS[3:]))
+
+
+class TestSyllables(unittest.TestCase):
+    def test_syllable_to_phones(self):
+        self.assertEqual(chinese.syllable_to_phones('zh', 'ong1'), (('zh', 'ong'), 1))
+        self.assertEqual(chinese.syllable_to_phones('', 'i3'), (('y', 'i'), 3))
+        self.assertEqual(chinese.syllable_to_phones('d', 'uei4'), (('d', 'ui'), 4))
+        self.assertEqual(chinese.syllable_to_phones(',', ','), ((',',), 0))
+
+    def test_word_initials_finals_applies_sandhi(self):
+        initials, finals = chinese.word_initials_finals('你好', 'l')
+        self.assertEqual(initials, ('n', 'h'))
+        self.assertEqual(finals, ('i2', 'ao3'))
+
+    def test_g2p(self):
+        text = chinese.text_normalize('我们一起去看看吧！不知道你是不是也这么想？')
+        phones, tones, word2ph = chinese.g2p(text)
+        self.assertEqual(chinese.g2p(text), (phones, tones, word2ph))
+        self.assertEqual(len(word2ph), len(text) + 2)
+        self.assertEqual(sum(word2ph), len(phones))
+        self.assertEqual(len(tones), len(phones))
+
+
+class TestG2pBatch(unittest.TestCase):
+    texts = ['我们一起去看看吧!不知道你是不是也这么想?', '听一听,老虎老鼠.', '语音合成领域近年来发展迅速']
+
+    def setUp(self):
+        patcher = mock.patch.object(chinese, '_cut_cache', chinese.LRUCache(1000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_jieba_pass_for_all_texts(self):
+        lcut = mock.Mock(wraps=chinese.psg.lcut)
+        with mock.patch.object(chinese.psg, 'lcut', lcut):
+            results = chinese.g2p_batch(self.texts)
+        self.assertEqual(lcut.call_count, 1)
+        chinese._cut_cache.clear()
+        self.assertEqual(results, [chinese.g2p(text) for text in self.texts])
+
+
+class TestMixG2p(unittest.TestCase):
+    texts = [
+        '我最近在学习machine learning,希望能够在未来的artificial intelligence领域有所建树.',
+        '今天下午我们准备去shopping mall购物然后晚上去看一场movie.',
+    ]
+
+    def setUp(self):
+        tokenizer = mock.Mock()
+        tokenizer.tokenize = lambda text: text.lower().split()
+        for patcher in (
+            mock.patch.object(chinese, '_cut_cache', chinese.LRUCache(1000)),
+            mock.patch.object(chinese_mix, 'get_tokenizer', return_value=tokenizer),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_matches_cutting_each_chinese_run(self):
+        per_run = lambda segment_lists: [chinese._g2p(segments) for segments in segment_lists]
+        with mock.patch.object(chinese_mix, '_chinese_g2p_batch', per_run):
+            expected = [chinese_mix.g2p(text) for text in self.texts]
+        chinese._cut_cache.clear()
+        lcut = mock.Mock(wraps=chinese.psg.lcut)
+        with mock.patch.object(chinese.psg, 'lcut', lcut):
+            self.assertEqual(chinese_mix.g2p_batch(self.texts), expected)
+        self.assertEqual(lcut.call_count, 1)
+
+
+class TestJiebaCache(unittest.TestCase):
+    def test_build_jieba_cache(self):
+        tmp_dir = chinese.jieba.dt.tmp_dir
+        self.addCleanup(setattr, chinese.jieba.dt, 'tmp_dir', tmp_dir)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = chinese.build_jieba_cache(cache_dir)
+            self.assertEqual(path, os.path.join(cache_dir, 'jieba.cache'))
+            with open(path, 'rb') as f:
+                freq, total = marshal.load(f)
+            self.assertEqual(total, chinese.jieba.dt.total)
+            self.assertIn('语音', freq)
+
+    def test_import_has_no_side_effects(self):
+        code = 'import jieba; t = jieba.dt.tmp_dir; import melo.text.chinese; assert jieba.dt.tmp_dir == t'
+        with tempfile.TemporaryDirectory() as home:
+            env = dict(os.environ, HOME=home, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            env.pop('MELO_JIEBA_CACHE_DIR', None)
+            subprocess.run([sys.executable, '-c', code], env=env, check=True)
+            self.assertEqual(os.listdir(home), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
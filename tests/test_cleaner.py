@@ -0,0 +1,33 @@
+import unittest
+from unittest import mock
+from melo.text import cleaner
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_each_module_warmed_once(self):
+        spanish = mock.Mock(__name__='melo.text.spanish')
+        chinese = mock.Mock(__name__='melo.text.chinese')
+        modules = {'ES': spanish, 'SP': spanish, 'ZH': chinese}
+        with mock.patch.object(cleaner, 'language_module_map', modules), \
+                mock.patch.object(cleaner.gc, 'freeze') as freeze:
+            cleaner.warm_up()
+            cleaner.warm_up(['ZH'], freeze=True)
+        self.assertEqual(spanish.warm_up.call_count, 1)
+        self.assertEqual(chinese.warm_up.call_count, 2)
+        self.assertEqual(freeze.call_count, 1)
+
+
+class TestCleanTexts(unittest.TestCase):
+    def test_uses_g2p_batch(self):
+        module = mock.Mock(__name__='melo.text.french')
+        module.text_normalize.side_effect = str.lower
+        module.g2p_batch.return_value = [(['a'], [0], [1]), (['b'], [0], [1])]
+        with mock.patch.object(cleaner, 'language_module_map', {'FR': module}):
+            cleaned = cleaner.clean_texts(['A', 'B'], 'FR')
+        module.g2p_batch.assert_called_once_with(['a', 'b'])
+        module.g2p.assert_not_called()
+        self.assertEqual(cleaned, [('a', ['a'], [0], [1]), ('b', ['b'], [0], [1])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import unittest
+import tempfile
+from unittest import mock
+from melo.text import english
+from melo.text.cache import LRUCache
+from melo.text.english_utils.oov import OOVLexicon, predict_batch
+from melo.text.english_utils.cmudict_index import CMUDictIndex, build_index
+
+
+def load_g2p():
+    from g2p_en import g2p
+
+    with mock.patch.object(g2p, 'cmudict', mock.Mock(dict=dict)):
+        return g2p.G2p()
+
+
+class TestCMUDictIndex(unittest.TestCase):
+    def test_round_trip(self):
+        entries = {
+            'HELLO': [['HH', 'AH0'], ['L', 'OW1']],
+            'A': [['AH0']],
+            "CAN'T": [['K', 'AE1', 'N', 'T']],
+            'ABC': [['EY2'], ['B', 'IY2'], ['S', 'IY1']],
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index')
+            build_index(entries, path)
+            build_index(entries, path)  # already built: left as is
+            index = CMUDictIndex(path)
+            self.assertEqual(dict(index), entries)
+            self.assertEqual(list(index), sorted(entries))
+            self.assertNotIn('AB', index)
+            self.assertNotIn('HELLOS', index)
+            self.assertNotIn('X' * 100, index)
+            self.assertIsNone(index.get('ZZZ'))
+            self.assertEqual(os.listdir(tmp), ['index'])
+
+
+class TestPredictBatch(unittest.TestCase):
+    def test_matches_per_word_predict(self):
+        g2p = load_g2p()
+        words = ['kubernetes', 'melotts', 'a', 'xqzvw', 'supercalifragilisticexpialidocious']
+        self.assertEqual(predict_batch(g2p, words), [g2p.predict(w) for w in words])
+        self.assertEqual(predict_batch(g2p, []), [])
+
+
+class TestWordCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.lexicon_path = os.path.join(tmp.name, 'oov.txt')
+        self.g2p = load_g2p()
+        self.batches = []
+
+        def counting_predict_batch(g2p, words):
+            self.batches.append(list(words))
+            return predict_batch(g2p, words)
+
+        patcher = mock.patch.multiple(
+            english,
+            eng_dict={'HELLO': [['HH', 'AH0'], ['L', 'OW1']]},
+            oov_lexicon=OOVLexicon(self.lexicon_path),
+            _word_cache=LRUCache(100),
+            _g2p=self.g2p,
+            predict_batch=counting_predict_batch,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_oov_words_are_batched_cached_and_persisted(self):
+        words = ['hello', 'kubernetes', 'melotts', 'kubernetes']
+        prons = english.words_to_phonemes(words)
+        self.assertEqual(prons[0], (('hh', 'ah', 'l', 'ow'), (0, 1, 0, 2)))
+        self.assertEqual(prons[1], prons[3])
+        self.assertEqual(self.batches, [['kubernetes', 'melotts']])
+
+        self.assertEqual(english.words_to_phonemes(['melotts', 'hello'])[0], prons[2])
+        self.assertEqual(len(self.batches), 1)
+
+        lexicon = OOVLexicon(self.lexicon_path)
+        self.assertEqual(len(lexicon), 2)
+        self.assertEqual(lexicon['melotts'], self.g2p.predict('melotts'))
+
+    def test_lexicon_is_used_before_g2p(self):
+        english.oov_lexicon.update({'melotts': ['M', 'EH1', 'L', 'OW0']})
+        self.assertEqual(english.words_to_phonemes(['melotts']), [(('m', 'eh', 'l', 'ow'), (0, 2, 0, 1))])
+        self.assertEqual(self.batches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
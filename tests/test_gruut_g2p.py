@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+from transformers import BasicTokenizer
+from melo.text import french, spanish
+from melo.text.fr_phonemizer import fr_to_ipa
+from melo.text.es_phonemizer import es_to_ipa
+
+FR_WORDS = ['Les', 'amis', 'étaient', 'là', '.', 'Il', 'a', '23', 'ans', ',', '«', 'vraiment', '»', "'", 'Xyzzoglub', '']
+ES_WORDS = ['¿', 'Y', 'a', 'quién', 'echaría', 'de', 'menos', '?', 'comió', '25', 'manzanas', '!']
+
+
+class TestPhonemizeWords(unittest.TestCase):
+    def setUp(self):
+        for module in (fr_to_ipa, es_to_ipa):
+            patcher = mock.patch.object(module, '_word_cache', module.LRUCache(1000))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_matches_one_word_at_a_time(self):
+        self.assertEqual(fr_to_ipa.fr2ipa_words(FR_WORDS), [fr_to_ipa.fr2ipa(w) for w in FR_WORDS])
+        self.assertEqual(es_to_ipa.es2ipa_words(ES_WORDS), [es_to_ipa.es2ipa(w) for w in ES_WORDS])
+
+    def test_no_liaison_between_words(self):
+        self.assertEqual(fr_to_ipa.fr2ipa_words(['les', 'amis'])[0], fr_to_ipa.fr2ipa('les'))
+
+    def test_memoized(self):
+        phonemizer = fr_to_ipa.get_phonemizer()
+        with mock.patch.object(phonemizer, 'phonemize_words', wraps=phonemizer.phonemize_words) as phonemize_words:
+            fr_to_ipa.fr2ipa_words(['bonjour', 'monde', 'bonjour'])
+            fr_to_ipa.fr2ipa_words(['monde', 'ami'])
+        self.assertEqual([c.args[0] for c in phonemize_words.call_args_list], [['bonjour', 'monde'], ['ami']])
+
+
+class TestG2pBatch(unittest.TestCase):
+    def test_matches_g2p(self):
+        tokenizer = BasicTokenizer(do_lower_case=False)
+        texts = {
+            french: ["Les amis étaient là.", "Il a 23 ans, vraiment !"],
+            spanish: ["¿Y a quién echaría de menos?", "el niño comió 25 manzanas."],
+        }
+        for module, sentences in texts.items():
+            with mock.patch.object(module, 'get_tokenizer', return_value=tokenizer):
+                self.assertEqual(module.g2p_batch(sentences), [module.g2p(s) for s in sentences])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import random
+import unittest
+from unittest import mock
+from melo.text import japanese
+
+
+def reference_kata2phoneme(text):
+    rules = [tuple(x.split("/")) for x in japanese._CONVRULES]
+    rulemap1, rulemap2 = ({k: v for k, v in rules if len(k) == i} for i in (1, 2))
+    text = text.strip()
+    res = []
+    while text:
+        if len(text) >= 2:
+            x = rulemap2.get(text[:2])
+            if x is not None:
+                text = text[2:]
+                res += x.split(" ")[1:]
+                continue
+        x = rulemap1.get(text[0])
+        if x is not None:
+            text = text[1:]
+            res += x.split(" ")[1:]
+            continue
+        res.append(text[0])
+        text = text[1:]
+    return res
+
+
+class TestKanaTrie(unittest.TestCase):
+    def test_matches_two_pass_rule_lookup(self):
+        rng = random.Random(0)
+        alphabet = list({ch for rule in japanese._CONVRULES for ch in rule.split("/")[0]}) + ['a', 'ー']
+        for _ in range(200):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            self.assertEqual(japanese.kata2phoneme(text), reference_kata2phoneme(text))
+
+    def test_words_do_not_share_matches(self):
+        self.assertEqual(japanese.kata2phoneme('キャ'), ['ky', 'a'])
+        self.assertEqual(japanese.kata2phoneme_words(['キ', 'ャ', 'キャ']), [
+            japanese.kata2phoneme('キ'), japanese.kata2phoneme('ャ'), ['ky', 'a'],
+        ])
+        self.assertEqual(japanese.kata2phoneme_words([]), [])
+
+
+    def test_converted_once_per_word(self):
+        japanese._word_phonemes.cache_clear()
+        self.addCleanup(japanese._word_phonemes.cache_clear)
+        convert = mock.Mock(wraps=japanese._KANA_TRIE.convert)
+        with mock.patch.object(japanese._KANA_TRIE, 'convert', convert):
+            prons = japanese.kata2phoneme_words(['テスト', 'カ', ' テスト'])
+            prons[0].append('x')
+            again = japanese.kata2phoneme_words(['テスト'])
+        self.assertEqual(convert.call_count, 2)
+        self.assertEqual(again, [japanese.kata2phoneme('テスト')])
+
+
+if __name__ == '__main__':
+    unittest.main()
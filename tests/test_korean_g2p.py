@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+from melo.text import korean
+
+
+class FakeG2p:
+    """Stands in for g2pkk: one rule inside a word, one across two words, and digits spelled out with a space."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return text.replace('학교', '학꾜').replace('밥 먹', '밤 먹').replace('3', '삼 개')
+
+
+class TestWordsToPhonemes(unittest.TestCase):
+    def setUp(self):
+        self.g2p = FakeG2p()
+        patcher = mock.patch.multiple(korean, g2p_kr=self.g2p, _sentence_cache=korean.LRUCache(korean.SENTENCE_CACHE_SIZE))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_g2p_call_for_all_words(self):
+        prons = korean.words_to_phonemes(['학교에', '갔다', '학교에'])
+        self.assertEqual(self.g2p.calls, ['학교에 갔다 학교에'])
+        self.assertEqual(prons[0], korean.korean_text_to_phonemes('학교에'))
+        self.assertEqual(prons[0], prons[2])
+        self.assertEqual(prons[1], '갔다')
+
+    def test_memoized_per_sentence(self):
+        korean.words_to_phonemes(['학교에', '갔다'])
+        korean.words_to_phonemes(['학교에', '갔다'])
+        korean.words_to_phonemes(['갔다'])
+        self.assertEqual(self.g2p.calls, ['학교에 갔다', '갔다'])
+
+    def test_independent_of_call_order(self):
+        alone, together = ['밥'], ['밥', '먹고']
+        first = [korean.words_to_phonemes(alone), korean.words_to_phonemes(together)]
+        korean._sentence_cache.clear()
+        second = [korean.words_to_phonemes(together), korean.words_to_phonemes(alone)][::-1]
+        self.assertEqual(first, second)
+        self.assertEqual(first[1][0], korean.korean_text_to_phonemes('밤'))
+        self.assertEqual(first[0][0], korean.korean_text_to_phonemes('밥'))
+
+    def test_bounded(self):
+        with mock.patch.object(korean._sentence_cache, 'maxsize', 2):
+            for word in ('가', '나', '다'):
+                korean.words_to_phonemes([word])
+        self.assertEqual(list(korean._sentence_cache), [('나',), ('다',)])
+
+    def test_misaligned_output_falls_back_to_single_words(self):
+        prons = korean.words_to_phonemes(['사과', '3'])
+        self.assertEqual(self.g2p.calls, ['사과 3', '사과', '3'])
+        self.assertEqual(prons[1], korean.korean_text_to_phonemes('3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import pickle
+import unittest
+import threading
+import torch
+from melo.models import Generator
+from melo.text import symbols
+from helpers import build_synthesizer
+
+
+def build_generator(resblock="1"):
+    torch.manual_seed(0)
+    generator = Generator(
+        16, resblock, [3, 7, 11], [[1, 3, 5]] * 3, [8, 8, 2, 2], 64, [16, 16, 4, 4], gin_channels=8
+    ).eval()
+    for p in generator.parameters():
+        p.data.normal_(0, 0.1)
+    return generator
+
+
+class TestChunkedDecode(unittest.TestCase):
+    def test_chunks_match_monolithic_decode(self):
+        generator = build_generator()
+        x, g = torch.randn(2, 16, 203), torch.randn(2, 8, 1)
+        with torch.no_grad():
+            full = generator(x, g=g)
+            for overlap in (0, 4):
+                chunks = list(generator.chunked_forward(x, g=g, chunk_size=50, overlap=overlap))
+                self.assertGreaterEqual(len(chunks), 4)
+                o = torch.cat(chunks, dim=-1)
+                self.assertEqual(o.shape, full.shape)
+                self.assertTrue(torch.allclose(o, full, atol=1e-5))
+
+    def test_short_input_is_one_chunk(self):
+        generator = build_generator()
+        x = torch.randn(1, 16, 10)
+        with torch.no_grad():
+            chunks = list(generator.chunked_forward(x, chunk_size=64))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].size(-1), 10 * generator.upsample_factor)
+
+
+def infer_inputs(batch_size=2, length=9):
+    torch.manual_seed(1)
+    x = torch.randint(1, len(symbols), (batch_size, length))
+    zeros = torch.zeros(batch_size, length, dtype=torch.long)
+    lengths = torch.full((batch_size,), length, dtype=torch.long)
+    return x, lengths, zeros, zeros, torch.randn(batch_size, 1024, length), torch.randn(batch_size, 768, length)
+
+
+class TestSpeakerConditioning(unittest.TestCase):
+    def infer(self, model, sid, g=None):
+        x, lengths, tone, language, bert, ja_bert = infer_inputs(len(sid))
+        with torch.no_grad():
+            return model.infer(x, lengths, sid, tone, language, bert, ja_bert, sdp_ratio=0.5,
+                               noise_scale=0., noise_scale_w=0., g=g)[0]
+
+    def test_matches_uncached_speaker_embedding(self):
+        for use_transformer_flow in (True, False):
+            model = build_synthesizer(use_transformer_flow)
+            sid = torch.LongTensor([1, 3])
+            expected = self.infer(model, sid, g=model.emb_g(sid).unsqueeze(-1))
+            self.assertTrue(torch.allclose(self.infer(model, sid), expected, atol=1e-6))
+            self.assertTrue(torch.allclose(self.infer(model, sid), expected, atol=1e-6))
+
+    def test_projections_computed_once_per_speaker(self):
+        model = build_synthesizer()
+        calls = []
+        model.dec.cond.register_forward_hook(lambda *args: calls.append(1))
+        for _ in range(3):
+            self.infer(model, torch.LongTensor([2]))
+        self.assertEqual(len(calls), 1)
+        self.infer(model, torch.LongTensor([0]))
+        self.assertEqual(len(calls), 2)
+
+    def test_cache_dropped_when_weights_change(self):
+        model = build_synthesizer()
+        sid = torch.LongTensor([1])
+        self.infer(model, sid)
+        state = {k: v + 0.1 for k, v in model.state_dict().items()}
+        model.load_state_dict(state)
+        expected = self.infer(model, sid, g=model.emb_g(sid).unsqueeze(-1))
+        self.assertTrue(torch.allclose(self.infer(model, sid), expected, atol=1e-6))
+        model.train()
+        self.assertEqual(len(model._speaker_cache), 0)
+
+    def test_concurrent_lookups_with_evictions(self):
+        model = build_synthesizer()
+        model.speaker_cache_size = 2
+        errors = []
+
+        def lookup(offset):
+            try:
+                for i in range(200):
+                    model.speaker_conditioning(torch.LongTensor([(i + offset) % 4]))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=lookup, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(model._speaker_cache), 2)
+        self.assertEqual(len(pickle.loads(pickle.dumps(model))._speaker_cache), 0)
+
+
+class TestPrepareForInference(unittest.TestCase):
+    def infer(self, model, sid):
+        x, lengths, tone, language, bert, ja_bert = infer_inputs(len(sid))
+        with torch.no_grad():
+            return model.infer(x, lengths, sid, tone, language, bert, ja_bert, sdp_ratio=0.5,
+                               noise_scale=0., noise_scale_w=0.)[0]
+
+    def test_matches_original_model(self):
+        for use_transformer_flow in (True, False):
+            model = build_synthesizer(use_transformer_flow)
+            prepared = build_synthesizer(use_transformer_flow).prepare_for_inference()
+            sid = torch.LongTensor([1, 3])
+            expected = self.infer(model, sid)
+            out = self.infer(prepared, sid)
+            self.assertEqual(out.shape, expected.shape)
+            self.assertTrue(torch.allclose(out, expected, atol=1e-5))
+
+    def test_strips_training_only_parts(self):
+        model = build_synthesizer().prepare_for_inference()
+        self.assertIsNone(model.enc_q)
+        names = [name for name, _ in model.named_parameters()]
+        self.assertFalse([name for name in names if name.endswith(("weight_g", "weight_v"))])
+        self.assertFalse([name for name in names if ".conv_q." in name])
+        self.assertEqual(model.enc_p.emb_scale, 1.0)
+        self.assertFalse(any(p.requires_grad for p in model.parameters()))
+        self.assertIs(model.prepare_for_inference(), model)
+
+
+if __name__ == '__main__':
+    unittest.main()
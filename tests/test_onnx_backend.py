@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+import torch
+from melo.onnx_backend import export_onnx, OnnxSynthesizer
+from helpers import build_tiny_tts, fake_inputs
+
+
+@unittest.skipUnless(importlib.util.find_spec('onnxruntime'), 'onnxruntime is not installed')
+class TestOnnxBackend(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.tts = build_tiny_tts()
+        export_onnx(cls.tts.model, cls.tmp_dir.name)
+        cls.onnx_tts = build_tiny_tts()
+        del cls.onnx_tts.model
+        cls.onnx_tts.model = OnnxSynthesizer(cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_export_writes_three_graphs(self):
+        for name in ('encoder.onnx', 'flow.onnx', 'decoder.onnx', 'melo_onnx.json'):
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, name)))
+        self.assertFalse(self.tts.model.training)
+
+    def test_matches_torch_backend(self):
+        torch.manual_seed(0)
+        inputs = [fake_inputs(n) for n in (3, 15, 40)]
+        kwargs = dict(sdp_ratio=0.3, noise_scale=0., noise_scale_w=0., speed=0.9)
+        expected = self.tts._infer_batch(inputs, [0, 1, 3], **kwargs)
+        for audio, ref in zip(self.onnx_tts._infer_batch(inputs, [0, 1, 3], **kwargs), expected):
+            self.assertEqual(audio.shape, ref.shape)
+            self.assertTrue(np.allclose(audio, ref, atol=1e-5))
+
+    def test_chunked_vocoder(self):
+        torch.manual_seed(1)
+        inputs = fake_inputs(20)
+        kwargs = dict(sdp_ratio=0., noise_scale=0., noise_scale_w=0., chunk_size=8)
+        chunks = list(self.onnx_tts._stream_audio([inputs], 2, **kwargs))
+        expected = list(self.tts._stream_audio([inputs], 2, **kwargs))
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(np.allclose(np.concatenate(chunks), np.concatenate(expected), atol=1e-5))
+
+    def test_break_silence(self):
+        torch.manual_seed(2)
+        inputs = [fake_inputs(n) for n in (7, 11)]
+        kwargs = dict(sdp_ratio=0., noise_scale=0., noise_scale_w=0., ssml_attributes={'break': [{'time': '100ms'}]})
+        expected = self.tts._infer_batch(inputs, [0, 1], **kwargs)
+        audios = self.onnx_tts._infer_batch(inputs, [0, 1], **kwargs)
+        self.assertEqual(self.onnx_tts.model.sampling_rate, self.tts.model.sampling_rate)
+        for audio, ref in zip(audios, expected):
+            self.assertEqual(audio.shape, ref.shape)
+            self.assertTrue(np.allclose(audio, ref, atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import threading
+import torch.nn as nn
+from melo.registry import ModelRegistry, model_footprint
+
+
+class FakeTTS(nn.Module):
+    loads = []
+
+    def __init__(self, language, device, use_hf, config_path, ckpt_path):
+        super().__init__()
+        FakeTTS.loads.append(language)
+        self.language = language
+        self.linear = nn.Linear(16, 16)  # 272 float32 parameters
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        FakeTTS.loads = []
+
+    def test_models_are_loaded_once_and_shared(self):
+        registry = ModelRegistry(loader=FakeTTS)
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(registry.get('EN'))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(FakeTTS.loads, ['EN'])
+        self.assertTrue(all(m is models[0] for m in models))
+        self.assertEqual(registry.total_bytes, model_footprint(models[0]))
+
+    def test_least_recently_used_model_is_evicted(self):
+        size = model_footprint(FakeTTS('EN', 'cpu', True, None, None))
+        FakeTTS.loads = []
+        registry = ModelRegistry(memory_budget=2 * size, loader=FakeTTS)
+        registry.get('EN')
+        registry.get('ES')
+        registry.get('EN')
+        registry.get('FR')
+        self.assertIn('EN', registry)
+        self.assertIn('FR', registry)
+        self.assertNotIn('ES', registry)
+        registry.get('ES')
+        self.assertEqual(FakeTTS.loads, ['EN', 'ES', 'FR', 'ES'])
+
+    def test_explicit_evict(self):
+        registry = ModelRegistry(loader=FakeTTS)
+        registry.get('EN')
+        registry.evict('EN')
+        self.assertNotIn('EN', registry)
+        self.assertEqual(registry.stats(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
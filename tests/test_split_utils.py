@@ -0,0 +1,60 @@
+import random
+import unittest
+from melo import split_utils
+
+EN_TEXT = ("I didn’t know what to do. I said please kill her because it would be better than being kidnapped,” "
+           "Ben, whose surname CNN is not using for security concerns, said on Wednesday. “It’s a nightmare. "
+           "I said ‘please kill her, don’t take her there.’ Really?! Yes... (it was) \"terrible\".\n\nThe end")
+ZH_TEXT = "好的，我来给你讲一个故事吧。从前有一个小姑娘，她叫做小红。小红非常喜欢在森林里玩耍！有一天，嗯。啊"
+
+
+def fragments(text, rng):
+    cuts = sorted(rng.sample(range(len(text) + 1), 20))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+class TestSentenceSplitter(unittest.TestCase):
+    def test_matches_split_sentence(self):
+        rng = random.Random(0)
+        for language, text in (('EN', EN_TEXT * 5), ('FR', EN_TEXT), ('ZH', ZH_TEXT * 5), ('JP', ZH_TEXT)):
+            for min_len in (0, 2, 10):
+                expected = split_utils.split_sentence(text, min_len=min_len, language_str=language)
+                for frags in (list(text), fragments(text, rng), [text]):
+                    got = list(split_utils.split_sentence_stream(frags, min_len=min_len, language_str=language))
+                    self.assertEqual(got, expected)
+
+    def test_emits_before_flush(self):
+        splitter = split_utils.SentenceSplitter('ZH')
+        self.assertEqual(splitter.feed('从前有一个小姑娘，她叫做小红。小红'), [])
+        self.assertEqual(splitter.feed('非常'), ['从前有一个小姑娘, 她叫做小红.'])
+        self.assertEqual(splitter.flush(), ['小红非常'])
+
+        splitter = split_utils.SentenceSplitter('EN')
+        emitted = []
+        for word in (EN_TEXT * 5).split(' '):
+            emitted += splitter.feed(word + ' ')
+        self.assertTrue(emitted)
+        self.assertEqual(emitted + splitter.flush(), split_utils.split_sentence(EN_TEXT * 5))
+
+    def test_short_tail_joins_previous_sentence(self):
+        splitter = split_utils.SentenceSplitter('ZH')
+        self.assertEqual(splitter.feed('从前有一个小姑娘，她叫做小红。'), [])
+        self.assertEqual(splitter.flush(), ['从前有一个小姑娘, 她叫做小红.'])
+        self.assertEqual(splitter.feed('从前有一个小姑娘，她叫做小红。好'), [])
+        self.assertEqual(splitter.flush(), ['从前有一个小姑娘, 她叫做小红. 好'])
+
+
+class TestTxtSplit(unittest.TestCase):
+    def test_long_sentences_are_cut_at_max_length(self):
+        text = 'word ' * 300
+        chunks = split_utils.txtsplit(text, 100, 200)
+        self.assertTrue(all(len(c) <= 200 for c in chunks))
+        self.assertEqual(' '.join(chunks), text.strip())
+
+    def test_quotes_are_kept_together(self):
+        self.assertEqual(split_utils.txtsplit('He said "stop. now." and left. Bye.', 1, 200),
+                         ['He said "stop. now. " and left.', 'Bye.'])
+
+
+if __name__ == '__main__':
+    unittest.main()